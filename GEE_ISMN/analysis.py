@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+from .results import to_table
+
+STATISTICS = ["n", "pearson", "spearman", "slope", "intercept", "rmse"]
+
+# Meteorological seasons, indexed by month (1-12).
+_SEASONS = np.array([None, "DJF", "DJF", "MAM", "MAM", "MAM", "JJA", "JJA",
+                     "JJA", "SON", "SON", "SON", "DJF"], dtype=object)
+
+
+def station_statistics(data, polarizations=("VV", "VH"), seasonal=False):
+    """Computes statistics of the matched soil moisture and backscatter pairs
+    of all stations in one grouped pass (no loop over the stations):
+
+        - n: Number of pairs
+        - pearson: Pearson correlation coefficient
+        - spearman: Spearman rank correlation coefficient
+        - slope, intercept: Least squares fit sm = slope * backscatter +
+        intercept (backscatter in dB)
+        - rmse: Root mean square error of this fit (in soil moisture units)
+
+    Statistics that are undefined (e.g. less than two pairs or constant
+    values) are NaN. Stations can then be ranked like:
+
+        stats = analysis.station_statistics(data_dict)
+        stats[stats.polarization == "VV"].sort_values("pearson")
+
+    :param data: Dictionary that was modified by postprocess.ts_filter() or
+    a table of results.to_table() / results.read_dataset().
+        :type: Dictionary or pandas.DataFrame
+    :param polarizations: (optional) Polarizations to evaluate.
+        :type: Tuple of String
+    :param seasonal: (optional) If True, the statistics are computed per
+    meteorological season (DJF, MAM, JJA, SON) of the S-1 acquisitions.
+        :type: bool
+
+    :return: pandas.DataFrame with one row per station, orbit, (season)
+    and polarization and the columns station, network, orbit, (season),
+    polarization and STATISTICS.
+    """
+    table = to_table(data) if isinstance(data, dict) else data
+
+    keys = ["station", "network", "orbit"]
+    frame = table[keys + ["sm"]].copy()
+    if seasonal:
+        frame["season"] = pd.Categorical(
+            _SEASONS[table["t_s1"].dt.month.values],
+            categories=["DJF", "MAM", "JJA", "SON"])
+        keys.append("season")
+
+    stats = []
+    for pol in polarizations:
+        frame["x"] = table[pol].values
+        pairs = frame[frame["x"].notna() & frame["sm"].notna()]
+        pol_stats = _pair_statistics(pairs, keys)
+        pol_stats.insert(len(keys), "polarization", pol)
+        stats.append(pol_stats)
+
+    stats = pd.concat(stats, ignore_index=True)
+
+    return stats.sort_values(keys + ["polarization"], ignore_index=True)
+
+
+def _pair_statistics(pairs, keys):
+    """Statistics of the columns x (backscatter) and sm per group."""
+    columns = pd.DataFrame({"x": pairs["x"].values.astype(float),
+                            "y": pairs["sm"].values.astype(float)},
+                           index=pairs.index)
+    groups = columns.groupby([pairs[key] for key in keys], observed=True,
+                             sort=False)
+
+    ranks = groups[["x", "y"]].rank()
+    columns["rx"], columns["ry"] = ranks["x"], ranks["y"]
+
+    # Deviations from the group means, which are numerically more stable
+    # than the raw sums of squares.
+    means = groups[["x", "y", "rx", "ry"]].transform("mean")
+    deviations = columns[["x", "y", "rx", "ry"]] - means
+    dx, dy = deviations["x"], deviations["y"]
+    drx, dry = deviations["rx"], deviations["ry"]
+    products = pd.DataFrame({"n": 1, "x": columns["x"], "y": columns["y"],
+                             "sxx": dx * dx, "syy": dy * dy, "sxy": dx * dy,
+                             "srxx": drx * drx, "sryy": dry * dry,
+                             "srxy": drx * dry}, index=pairs.index)
+
+    sums = products.groupby([pairs[key] for key in keys], observed=True,
+                            sort=False).sum()
+    n = sums["n"].values
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pearson = sums["sxy"].values / np.sqrt(sums["sxx"].values
+                                                * sums["syy"].values)
+        spearman = sums["srxy"].values / np.sqrt(sums["srxx"].values
+                                                  * sums["sryy"].values)
+        slope = sums["sxy"].values / sums["sxx"].values
+        intercept = (sums["y"].values - slope * sums["x"].values) / n
+        sse = np.maximum(sums["syy"].values - slope * sums["sxy"].values, 0)
+        rmse = np.sqrt(sse / n)
+
+    undefined = n < 2
+    for values in (pearson, spearman, slope, intercept, rmse):
+        values[undefined | ~np.isfinite(values)] = np.nan
+
+    stats = sums.index.to_frame(index=False)
+    stats["n"] = n
+    stats["pearson"] = pearson
+    stats["spearman"] = spearman
+    stats["slope"] = slope
+    stats["intercept"] = intercept
+    stats["rmse"] = rmse
+
+    return stats
@@ -0,0 +1,133 @@
+import os
+import hashlib
+import datetime
+import pandas as pd
+
+
+def cache_key(geometry, orbit):
+    """Creates the cache key of a backscatter timeseries. The key is based
+    on the serialized Earth Engine geometry object (which contains the
+    coordinates and, for polygons, the box size) and the orbit pass.
+
+    :param geometry: Geometry object of the station.
+        :type: ee.geometry.Geometry
+    :param orbit: Orbit pass; either "DESCENDING" or "ASCENDING"
+        :type: String
+
+    :return: Key (hex digest) that can be used as file name.
+    """
+    key = geometry.serialize() + "|" + orbit
+
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def load(cache_dir, key):
+    """Loads a cached backscatter timeseries.
+
+    :param cache_dir: Directory of the cache.
+        :type: String
+    :param key: Cache key (see cache_key()).
+        :type: String
+
+    :return: Dataframe with the columns VH, VV, angle and id or None if nothing
+    was cached for the key yet.
+    """
+    path = _path(cache_dir, key)
+
+    if not os.path.exists(path):
+        return None
+
+    return pd.read_pickle(path)
+
+
+def save(cache_dir, key, df):
+    """Stores a backscatter timeseries in the cache. The file is replaced
+    atomically, so an interrupted run never leaves a broken cache entry.
+
+    :param cache_dir: Directory of the cache. Created if it doesn't exist.
+        :type: String
+    :param key: Cache key (see cache_key()).
+        :type: String
+    :param df: Backscatter timeseries.
+        :type: pandas.DataFrame
+    """
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+
+    path = _path(cache_dir, key)
+    tmp_path = path + ".tmp" + str(os.getpid())
+    df.to_pickle(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def start_date(cached):
+    """Returns the date from which on new scenes have to be fetched, i.e.
+    one millisecond (the unit of system:time_start) after the last cached
+    acquisition.
+
+    :param cached: Cached backscatter timeseries or None.
+        :type: pandas.DataFrame
+
+    :return: datetime.datetime or None if nothing was cached.
+    """
+    if cached is None or len(cached) == 0:
+        return None
+
+    return cached.index.max().to_pydatetime() \
+        + datetime.timedelta(milliseconds=1)
+
+
+def cached_range(cached):
+    """Returns the time range that is completely contained in a cached
+    backscatter timeseries: from the start of the requested time windows
+    (None: the whole S-1 archive, recorded by update()) until
+    start_date(). Only scenes outside of this range have to be fetched.
+
+    :param cached: Cached backscatter timeseries or None.
+        :type: pandas.DataFrame
+
+    :return: Tuple (start, end) of datetimes (start may be None) or None
+    if nothing was cached.
+    """
+    if cached is None or len(cached) == 0:
+        return None
+
+    return cached.attrs["start"], start_date(cached)
+
+
+def update(cached, new, start=None):
+    """Adds newly fetched scenes to a cached backscatter timeseries. New
+    scenes are only fetched outside of cached_range(), so both inputs
+    don't overlap (scenes that are in both are kept once, by id).
+
+    :param cached: Cached backscatter timeseries or None.
+        :type: pandas.DataFrame
+    :param new: Newly fetched backscatter timeseries or None.
+        :type: pandas.DataFrame
+    :param start: (optional) Start of the time window that was requested
+    (None: the whole S-1 archive). It is recorded with the timeseries as
+    start of its cached_range(), if the window joins the cached range.
+        :type: datetime.datetime
+
+    :return: Sorted dataframe or None if both inputs are None.
+    """
+    frames = [df for df in (cached, new) if df is not None]
+
+    if not frames:
+        return None
+
+    df = pd.concat(frames)
+    df = df[~df["id"].duplicated(keep="first").values]
+    df = df.sort_index(axis=0, kind="mergesort")
+
+    covered = cached_range(cached)
+    if covered is not None and (start is None or start <= covered[1]):
+        start = None if start is None or covered[0] is None \
+            else min(start, covered[0])
+    df.attrs["start"] = start
+
+    return df
+
+
+def _path(cache_dir, key):
+    return os.path.join(cache_dir, key + ".pkl")
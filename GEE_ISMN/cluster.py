@@ -0,0 +1,64 @@
+import math
+
+
+def group_locations(data_dict, tolerance=0):
+    """Groups the stations of a dictionary by location. Stations share a
+    location if their geometries have the same box size and their
+    coordinates are identical (tolerance=0) or fall into the same cell of a
+    grid with a cell size of tolerance meters. Several sensors of one
+    station and stations only a few meters apart can then be extracted
+    once.
+
+    :param data_dict: Dictionary with station records (station.Station).
+        :type: Dictionary
+    :param tolerance: (optional) Cell size in meters. 0 only groups
+    stations with identical coordinates.
+        :type: int or float
+
+    :return: List of groups (lists of dictionary keys) in the order of
+    data_dict. The first key of each group is its representative, whose
+    geometry is used for the whole group. Stations without a geometry
+    object form a group of their own.
+    """
+    groups = {}
+
+    for key, station in data_dict.items():
+        if station.geometry is None:
+            location = key
+        elif tolerance:
+            dlat = tolerance / 111320.
+            dlon = dlat / max(math.cos(math.radians(station.latitude)), 1e-6)
+            location = (station.box_size,
+                        math.floor(station.latitude / dlat),
+                        math.floor(station.longitude / dlon))
+        else:
+            location = (station.box_size, station.latitude, station.longitude)
+
+        groups.setdefault(location, []).append(key)
+
+    return list(groups.values())
+
+
+def order_by_footprint(data_dict, groups, cell_size=1.0):
+    """Orders location groups (see group_locations()) by grid cells of
+    cell_size degrees. Neighbouring stations, which are usually covered by
+    the same Sentinel-1 scenes, are then extracted in the same batch.
+
+    :param data_dict: Dictionary with station records (station.Station).
+        :type: Dictionary
+    :param groups: Location groups (output of group_locations()).
+        :type: List of lists of String
+    :param cell_size: (optional) Cell size in degrees.
+        :type: float
+
+    :return: List of groups, sorted by cell and coordinates of the
+    representatives.
+    """
+    def _cell(group):
+        station = data_dict[group[0]]
+
+        return (math.floor(station.latitude / cell_size),
+                math.floor(station.longitude / cell_size),
+                station.latitude, station.longitude)
+
+    return sorted(groups, key=_cell)
@@ -1,15 +1,44 @@
-import ee
-import copy
-import numpy as np
 import pandas as pd
 import datetime
 import csv
+from .executor import get_executor
+from .lazy import lazy_import
+from . import cache, cluster, instrument
 
+ee = lazy_import("ee")
 
-def lc_filter(data_dict, input_dict, landcover_ids=None):
-    """Adds GEE geometry objects to the data dictionary (data_dict) based on
-    parameters in input_dict. The data dictionary is then filtered based on
-    landcover IDs.
+# 'end' of stations without a time window (9999-12-31, in milliseconds).
+_MAX_MILLIS = 253402214400000
+
+# Maximum number of scenes that are requested at once for a single station
+# and orbit. Longer timeseries are fetched in date windows (see
+# _fetch_windows()).
+_MAX_SCENES = 1000
+
+# Maximum number of features (scenes x stations) that are requested at once
+# by the batch extraction (element limit of collections in Earth Engine).
+_MAX_FEATURES = 5000
+
+# Windows aren't split below one day (in milliseconds).
+_MIN_WINDOW = 86400000
+
+# Properties that are fetched per S-1 scene (see _columns_of()).
+_COLUMNS = ["id", "time", "VV", "VH", "angle"]
+
+# Parts of error messages (lower case) of requests that failed because they
+# were too large for Earth Engine (element, value or memory limits,
+# computation timeouts).
+_TOO_LARGE_MESSAGES = ("too many values", "too many pixels",
+                       "accumulating over", "memory limit", "timed out",
+                       "response size", "payload size")
+
+
+@instrument.stage("lc_filter")
+def lc_filter(data_dict, input_dict, landcover_ids=None, batch_size=500,
+              executor=None, journal=None):
+    """Adds GEE geometry objects to the station records of the data
+    dictionary (data_dict) based on parameters in input_dict. The data
+    dictionary is then filtered based on landcover IDs.
 
     :param data_dict: Dictionary containing ISMN data to be analysed.
     Output of preprocess.data_import().
@@ -29,16 +58,38 @@ def lc_filter(data_dict, input_dict, landcover_ids=None):
             40 = Cultivated and managed vegetation / agriculture
             60 = Bare / sparse vegetation
         :type: single int or list of int
-
-    :return: The filtered version of the input dictionary "data_dict"
+    :param batch_size: (optional) Number of stations that are classified
+    with a single request. If set to None, one request per station is sent.
+        :type: int or None
+    :param executor: (optional) Executor that sends the Earth Engine
+    requests. Defaults to executor.get_executor().
+        :type: executor.RequestExecutor
+    :param journal: (optional) Journal of a resumable run. Landcover
+    classes of stations that were recorded in the journal are taken from
+    it, all others are recorded as soon as they are classified.
+        :type: journal.Journal
+
+    :return: The filtered version of the input dictionary "data_dict". The
+    station records are shared with the input dictionary.
     """
-    data_dict_copy = copy.deepcopy(data_dict)
+    landcover_ids = _landcover_ids(landcover_ids)
+
+    data_dict_edit = _ee_geometries(data_dict, input_dict)
+    data_dict_filt = _ee_filter(data_dict_edit, landcover_ids, batch_size,
+                                executor, journal)
+
+    return data_dict_filt
+
 
+def _landcover_ids(landcover_ids):
+    """Checks the landcover IDs (see lc_filter()) and returns them as a
+    list.
+    """
     if landcover_ids is None:
         landcover_ids = [40, 60]
 
     elif type(landcover_ids) == int:
-        landcover_ids = list(map(int, landcover_ids))
+        landcover_ids = [landcover_ids]
 
     elif type(landcover_ids) == list:
         landcover_ids = landcover_ids
@@ -48,190 +99,395 @@ def lc_filter(data_dict, input_dict, landcover_ids=None):
                          "or a list of integers.\n For valid landcover IDs, "
                          "please refer to: https://tinyurl.com/cgls-lc100")
 
-    data_dict_edit = _ee_geometries(data_dict_copy, input_dict)
-    data_dict_filt = _ee_filter(data_dict_edit, landcover_ids)
-
-    return data_dict_filt
+    return landcover_ids
 
 
 def _ee_geometries(data_dict, input_dict):
-    """Takes latitude & longitude from the the dictionary that
-    contains the ISMN data (data_dict) and converts them to GEE geometry
-    objects based on parameters in input_dict.
+    """Takes latitude & longitude from each station record of the
+    dictionary that contains the ISMN data (data_dict) and converts them to
+    GEE geometry objects based on parameters in input_dict. Stations that
+    already have a geometry object are left unchanged. Stations with
+    identical coordinates share the same geometry object.
 
     For parameter description see: lc_filter()
 
     :return: data_dict with added EE geometry objects.
     """
-    data_dict_copy = copy.deepcopy(data_dict)
-
     if input_dict["box_yn"] == 0:
-        for key in data_dict_copy.keys():
-            try:
-                check = type(data_dict_copy[key][3]) == ee.geometry.Geometry
-                if check:
-                    pass
-                else:
-                    raise TypeError("Something is wrong. I didn't "
-                                    "expect an object of type\n "
-                                    + str(type(data_dict_copy[key][3])) +
-                                    "here.")
-
-            except IndexError:  # Nothing here, which is good!
-                data_dict_copy[key].append(
-                    ee.Geometry.Point(float(data_dict_copy[key][1]),
-                                      float(data_dict_copy[key][0])))
-
+        box_size = None
     elif input_dict["box_yn"] == 1:
-        for key in data_dict_copy.keys():
-            try:
-                check = type(data_dict_copy[key][3]) == ee.geometry.Geometry
-                if check:
-                    pass
-                else:
-                    raise TypeError("Something is wrong. I didn't expect "
-                                    "an object of type\n "
-                                    + str(type(data_dict_copy[key][3]))
-                                    + "here.")
-
-            except IndexError:  # Nothing here, which is good!
-                data_dict_copy[key].append(
-                    ee.Geometry.Point(float(data_dict_copy[key][1]),
-                                      float(data_dict_copy[key][0]))
-                        .buffer(input_dict["box_size"] / 2)
-                        .bounds())
+        box_size = input_dict["box_size"]
     else:
         raise ValueError("The variable box_yn should be"
                          " 0 (extract backscatter for pixel coordinates) \n "
                          "or 1 (extract mean backscatter for a bounding box). "
                          "\n Please run setup_pkg() again before continuing!")
 
-    return data_dict_copy
+    geometries = {}
+
+    for station in data_dict.values():
+        if station.geometry is not None:
+            continue
+
+        location = (station.longitude, station.latitude)
+        geometry = geometries.get(location)
+
+        if geometry is None:
+            geometry = ee.Geometry.Point(station.longitude, station.latitude)
+            if box_size is not None:
+                geometry = geometry.buffer(box_size / 2).bounds()
+            geometries[location] = geometry
+
+        station.geometry = geometry
+        station.box_size = box_size
+
+    return data_dict
 
 
-def _ee_filter(data_dict, landcover_ids):
+def _ee_filter(data_dict, landcover_ids, batch_size=500, executor=None,
+               journal=None):
     """The landcover type of each location is checked based on the
     CGLS-LC100 dataset (https://tinyurl.com/cgls-lc100). The input
     dictionary ( data_dict) is then filtered based on provided landcover IDs
-    (landcover_ids).
+    (landcover_ids). Every geometry object is only classified once, even
+    if it is shared by several stations.
 
     For parameter description see: lc_filter()
 
-    :return: Filtered version of data_dict.
+    :return: Filtered version of data_dict. The landcover class is added to
+    each station record.
     """
-    data_dict_copy = copy.deepcopy(data_dict)
     valid_ids = landcover_ids
     data_dict_filt = {}
-    lc_values = []
 
-    lc = ee.ImageCollection(
-        "COPERNICUS/Landcover/100m/Proba-V/Global").first()
+    if executor is None:
+        executor = get_executor()
+
+    lc = _landcover_image()
+
+    keys = list(data_dict.keys())
+    known = {} if journal is None else dict(journal.landcover)
+    unique = {}
+    members = {}
+    for key in keys:
+        if key in known:
+            continue
+        unique.setdefault(id(data_dict[key].geometry),
+                          data_dict[key].geometry)
+        members.setdefault(id(data_dict[key].geometry), []).append(key)
+    geometries = list(unique.values())
+
+    def _record(chunk, chunk_values):
+        if journal is not None:
+            journal.record_landcover((key, lc_val) for geo, lc_val
+                                     in zip(chunk, chunk_values)
+                                     for key in members[id(geo)])
+
+    if batch_size is None:
+        def _classify(geo):
+            lc_val = _lc_value(lc, geo, executor)
+            _record([geo], [lc_val])
+            return lc_val
+
+        values = executor.map(_classify, geometries)
+    else:
+        values = _lc_values_batch(lc, geometries, batch_size, executor,
+                                  _record)
 
-    for key in data_dict_copy.keys():
-        lc_val = lc.select("discrete_classification") \
-            .reduceRegion(ee.Reducer.first(), data_dict_copy[key][3], 10) \
-            .get("discrete_classification") \
-            .getInfo()
+    values = dict(zip(unique.keys(), values))
+    lc_values = [known[key] if key in known
+                 else values[id(data_dict[key].geometry)] for key in keys]
 
-        if lc_val in valid_ids:
-            data_dict_filt[key] = data_dict_copy[key]
+    for key, lc_val in zip(keys, lc_values):
+        data_dict[key].landcover = lc_val
 
-        lc_values.append(lc_val)
+        if lc_val in valid_ids:
+            data_dict_filt[key] = data_dict[key]
 
     with open('./data/stations.csv', 'a', newline='') as csvfile:
         filewriter = csv.writer(csvfile, delimiter=',')
         filewriter.writerow(lc_values)
 
     print(str(len(data_dict_filt.items())) +
-          " out of " + str(len(data_dict_copy.items())) +
+          " out of " + str(len(data_dict.items())) +
           " locations remain after applying the land cover filter.")
 
     return data_dict_filt
 
 
-def get_s1_backscatter(data_dict_filt):
+def _landcover_image():
+    """Returns the discrete classification of the CGLS-LC100 dataset."""
+    return ee.ImageCollection(
+        "COPERNICUS/Landcover/100m/Proba-V/Global").first() \
+        .select("discrete_classification")
+
+
+def _lc_value(lc, geometry, executor):
+    """Returns the landcover class of a single geometry (one request)."""
+    return executor.get_info(
+        lc.reduceRegion(ee.Reducer.first(), geometry, 10)
+        .get("discrete_classification"))
+
+
+def _lc_values_batch(lc, geometries, batch_size, executor, on_chunk=None):
+    """Returns the landcover classes of a list of geometries. The geometries
+    are combined to feature collections of (at most) batch_size features,
+    which are classified with reduceRegions(). This results in one request
+    per chunk instead of one request per geometry. If given, on_chunk is
+    called with the geometries and classes of every finished chunk.
+
+    :return: List of landcover classes in the order of geometries. None for
+    locations without a valid pixel.
+    """
+    reducer = ee.Reducer.first().setOutputs(["discrete_classification"])
+
+    def _classify(chunk):
+        fc = ee.FeatureCollection([ee.Feature(geo, {"idx": j})
+                                   for j, geo in enumerate(chunk)])
+        fc = lc.reduceRegions(collection=fc, reducer=reducer, scale=10) \
+            .select(["idx", "discrete_classification"], None, False)
+
+        values = [None] * len(chunk)
+        for feature in executor.get_info(fc)["features"]:
+            properties = feature["properties"]
+            values[properties["idx"]] = \
+                properties.get("discrete_classification")
+
+        if on_chunk is not None:
+            on_chunk(chunk, values)
+
+        return values
+
+    chunks = [geometries[i:i + batch_size]
+              for i in range(0, len(geometries), batch_size)]
+
+    return [lc_val for values in executor.map(_classify, chunks)
+            for lc_val in values]
+
+
+@instrument.stage("get_s1_backscatter")
+def get_s1_backscatter(data_dict_filt, batch_size=None, executor=None,
+                       cache_dir=None, margin_days=0, tolerance=0,
+                       footprint_cell=None, journal=None, verbose=False):
     """For each key (= ISMN station) of the input dictionary, this function
     gets all available Sentinel-1 scenes (descending & ascending) and adds
-    them to the dictionary as image collections.
+    them to the station record as image collections.
     Afterwards backscatter timeseries are extracted for both image
-    collections and added to the dictionary as pandas dataframes.
-
-    :param data_dict_filt: Output dictionary of lc_filter(), which at this
-    point should contain the following values for each key:
-            - latitude (int)
-            - longitude (int)
-            - Soil moisture data (dataframe)
-            - GEE geometry object (ee.geometry.Geometry of type 'Point' or
-            'Polygon')
+    collections and added to the station record as pandas dataframes.
+
+    :param data_dict_filt: Output dictionary of lc_filter(). At this point
+    each station record (station.Station) should contain a GEE geometry
+    object (ee.geometry.Geometry of type 'Point' or 'Polygon').
         :type: Dictionary
+    :param batch_size: (optional) If set, the backscatter of batch_size
+    stations is extracted from a shared S-1 collection in a single
+    server-side computation (see _get_s1_backscatter_batch()). Otherwise
+    each station and orbit is requested separately.
+        :type: int or None
+    :param executor: (optional) Executor that sends the Earth Engine
+    requests. Stations (or chunks of stations) are processed concurrently
+    up to its concurrency limit. Defaults to executor.get_executor().
+        :type: executor.RequestExecutor
+    :param cache_dir: (optional) Directory of a persistent backscatter
+    cache (e.g. './data/S1_Cache/'). Extracted timeseries are stored per
+    geometry and orbit, together with the time range they cover (see
+    cache.cached_range()). On later runs, only scenes outside of this range
+    are fetched and added to the cached timeseries.
+        :type: String
+    :param margin_days: (optional) The S-1 collections of each station are
+    limited to the time covered by its soil moisture data, extended by
+    margin_days on both sides. Scenes outside of this window can't be
+    matched by postprocess.ts_filter() anyway. None disables the temporal
+    filter (the whole S-1 archive is extracted).
+        :type: int or None
+    :param tolerance: (optional) Stations at the same location (see
+    cluster.group_locations(), tolerance in meters) are extracted only
+    once, using the geometry of the first station, and the result is added
+    to all of them. None extracts every station separately.
+        :type: int, float or None
+    :param footprint_cell: (optional) If set, the locations are ordered by
+    grid cells of footprint_cell degrees (see cluster.order_by_footprint()),
+    so that each batch contains neighbouring stations that share S-1
+    scenes. Only used together with batch_size.
+        :type: float
+    :param journal: (optional) Journal of a resumable run. Stations whose
+    backscatter was recorded in the journal are loaded from it instead of
+    being extracted again; all others are recorded as soon as their
+    location (or, with batch_size, their chunk) is finished.
+        :type: journal.Journal
+    :param verbose: (optional) If True, the number of unique locations is
+    printed.
+        :type: bool
 
     :return: data_dict_filt with added image collections and dataframes
     containing backscatter timeseries (both descending & ascending).
     """
-    data_dict = copy.deepcopy(data_dict_filt)
-    data_dict = _get_image_collection(data_dict)  # Add S-1 image collection
+    if tolerance is None:
+        groups = [[key] for key in data_dict_filt.keys()]
+    else:
+        groups = cluster.group_locations(data_dict_filt, tolerance)
 
-    for key in data_dict.keys():
-        try:
-            geo_type = data_dict[key][3].getInfo()['type']
-
-            if geo_type == 'Point':
-
-                if data_dict[key][4].size().getInfo() > 0:
-                    s1_data_desc = _time_series_of_a_point(data_dict[key][4],
-                                                           data_dict[key][3])
-                    data_dict[key].append(s1_data_desc)
-                else:
-                    print(str(key) + ": Image collection of the descending "
-                                     "track is empty.\n No backscatter "
-                                     "data was extracted.")
-                    data_dict[key].append(None)
-
-                if data_dict[key][5].size().getInfo() > 0:
-                    s1_data_asc = _time_series_of_a_point(data_dict[key][5],
-                                                          data_dict[key][3])
-                    data_dict[key].append(s1_data_asc)
-                else:
-                    print(str(key) + ": Image collection of the ascending "
-                                     "track is empty.\n No backscatter "
-                                     "data was extracted.")
-                    data_dict[key].append(None)
-
-            elif geo_type == 'Polygon':
-
-                if data_dict[key][4].size().getInfo() > 0:
-                    s1_data_desc = _time_series_of_a_region(data_dict[key][4],
-                                                            data_dict[key][3])
-                    data_dict[key].append(s1_data_desc)
-                else:
-                    print(str(key) + ": Image collection of the descending "
-                                     "track is empty.\n No backscatter "
-                                     "data was extracted.")
-                    data_dict[key].append(None)
-
-                if data_dict[key][5].size().getInfo() > 0:
-                    s1_data_asc = _time_series_of_a_region(data_dict[key][5],
-                                                           data_dict[key][3])
-                    data_dict[key].append(s1_data_asc)
-                else:
-                    print(str(key) + ": Image collection of the ascending "
-                                     "track is empty.\n No backscatter "
-                                     "data was extracted.")
-                    data_dict[key].append(None)
-
-            else:
-                raise ValueError(str(key)
-                                 + " - I didn't expect an object of type "
-                                 + str(geo_type) + "here.")
-
-        except IndexError:
-            print("A GEE geometry object is missing for: "
-                  + str(key))
+    if footprint_cell is not None:
+        groups = cluster.order_by_footprint(data_dict_filt, groups,
+                                            footprint_cell)
+
+    if verbose:
+        print(str(len(groups)) + " unique locations for "
+              + str(len(data_dict_filt)) + " stations.")
+
+    # Add S-1 collections
+    data_dict = _get_image_collection(data_dict_filt, margin_days, groups)
+
+    if journal is not None:
+        groups = _resume(data_dict, groups, journal)
+
+    if executor is None:
+        executor = get_executor()
+
+    if batch_size is not None:
+        return _get_s1_backscatter_batch(data_dict, batch_size, executor,
+                                         cache_dir, margin_days, groups,
+                                         journal)
+
+    def _extract(group):
+        window = _coverage([data_dict[key].sm_data for key in group],
+                           margin_days)
+        if window is None:
+            # No soil moisture data to match, no request.
+            s1_data = [None, None]
+        else:
+            with instrument.station(group[0]):
+                s1_data = _extract_station(group[0], data_dict[group[0]],
+                                           executor, cache_dir, window[0])
+        if s1_data is not None and journal is not None:
+            journal.record_backscatter(group, s1_data)
+
+        return s1_data
+
+    results = executor.map(_extract, groups)
+
+    for group, s1_data in zip(groups, results):
+        if s1_data is not None:
+            for key in group:
+                data_dict[key].backscatter_desc, \
+                    data_dict[key].backscatter_asc = s1_data
 
     return data_dict
 
 
-def _get_image_collection(data_dict_filt):
+def _resume(data_dict, groups, journal):
+    """Adds the backscatter recorded in a journal to the stations of all
+    location groups that are completely done.
+
+    :return: List of the groups that still have to be extracted.
+    """
+    remaining = []
+
+    for group in groups:
+        if not all(journal.done(key) for key in group):
+            remaining.append(group)
+            continue
+
+        for key in group:
+            data_dict[key].backscatter_desc, \
+                data_dict[key].backscatter_asc = journal.backscatter(key)
+
+    print(str(len(groups) - len(remaining)) + " locations were loaded from "
+          "the journal.")
+
+    return remaining
+
+
+def _extract_station(key, station, executor, cache_dir=None, start=None):
+    """Extracts the backscatter timeseries of a single station for both
+    the descending and the ascending image collection.
+
+    :param key: Dictionary key of the station.
+        :type: String
+    :param station: Station record with added image collections.
+        :type: station.Station
+    :param executor: Executor that sends the Earth Engine requests.
+        :type: executor.RequestExecutor
+    :param cache_dir: (optional) Directory of the backscatter cache.
+        :type: String
+    :param start: (optional) Start of the time window of the image
+    collections (see _coverage()), recorded in the cache.
+        :type: datetime.datetime
+
+    :return: List with the descending and ascending dataframe (None for
+    an empty image collection) or None if the geometry object is missing.
+    """
+    geometry = station.geometry
+
+    if geometry is None:
+        print("A GEE geometry object is missing for: "
+              + str(key))
+        return None
+
+    if station.box_size is None:
+        time_series = _time_series_of_a_point
+    else:
+        time_series = _time_series_of_a_region
+
+    s1_data = []
+    for img_collection, orbit in ((station.s1_desc, "DESCENDING"),
+                                  (station.s1_asc, "ASCENDING")):
+        cached = None
+        if cache_dir is not None:
+            cache_key = cache.cache_key(geometry, orbit)
+            cached = cache.load(cache_dir, cache_key)
+            img_collection = _skip_cached(img_collection,
+                                          cache.cached_range(cached))
+
+        df = None
+        info = executor.get_info(_collection_info(img_collection))
+        if info["size"] > 0:
+            df = time_series(img_collection, geometry, executor, info)
+
+        df = cache.update(cached, df, start)
+
+        if df is None:
+            print(str(key) + ": Image collection of the " + orbit.lower()
+                  + " track is empty.\n No backscatter data was "
+                    "extracted.")
+        elif cache_dir is not None:
+            cache.save(cache_dir, cache_key, df)
+
+        s1_data.append(df)
+
+    return s1_data
+
+
+def _skip_cached(img_collection, cached_range):
+    """Removes the scenes within the range of a cached timeseries (see
+    cache.cached_range()) from an image collection.
+    """
+    if cached_range is None:
+        return img_collection
+
+    start, end = cached_range
+
+    if start is None:
+        return img_collection.filter(_acquired_from(end))
+
+    return img_collection.filter(ee.Filter.Or(_acquired_before(start),
+                                              _acquired_from(end)))
+
+
+def _acquired_from(date):
+    """Returns a filter for images acquired at or after a (UTC) datetime.
+    Unlike filterDate() without an end date, which only covers a single
+    millisecond, the range is open.
+    """
+    return ee.Filter.gte("system:time_start", _millis(date))
+
+
+def _acquired_before(date):
+    """Returns a filter for images acquired before a (UTC) datetime."""
+    return ee.Filter.lt("system:time_start", _millis(date))
+
+
+def _get_image_collection(data_dict_filt, margin_days=0, groups=None):
     """Gets the available Sentinel-1 image collection (ascending and
     descending) for each Earth Engine geometry object of a dictionary.
 
@@ -239,132 +495,563 @@ def _get_image_collection(data_dict_filt):
     Earth Engine geometry objects that are used to retrieve the S-1 image
     collections.
         :type: Dictionary
-
-    :return: Dictionary with added S-1 image collections.
+    :param margin_days: (optional) See get_s1_backscatter().
+        :type: int or None
+    :param groups: (optional) Location groups (see
+    cluster.group_locations()). All stations of a group share the
+    collections of the first station, covering the time window of the
+    whole group. Defaults to one group per station.
+        :type: List of lists of String
+
+    :return: Dictionary with added S-1 image collections. Groups without
+    soil moisture data (see _coverage()) get no collections.
     """
-    data_dict = copy.deepcopy(data_dict_filt)
+    data_dict = data_dict_filt
 
-    pol_vv = ee.Filter.listContains('transmitterReceiverPolarisation', 'VV')
-    pol_vh = ee.Filter.listContains('transmitterReceiverPolarisation', 'VH')
-    mode = ee.Filter.eq('instrumentMode', 'IW')
+    if groups is None:
+        groups = [[key] for key in data_dict.keys()]
 
-    for key in data_dict.keys():
-        s1 = ee.ImageCollection('COPERNICUS/S1_GRD') \
-            .filter(pol_vv) \
-            .filter(pol_vh) \
-            .filter(mode) \
-            .filterBounds(data_dict[key][3])
+    for group in groups:
+        if data_dict[group[0]].geometry is None:
+            continue
+
+        window = _coverage([data_dict[key].sm_data for key in group],
+                           margin_days)
+        if window is None:
+            continue
+
+        s1 = _s1_collection().filterBounds(data_dict[group[0]].geometry)
+        if window[0] is not None:
+            s1 = s1.filterDate(*window)
 
         s1_desc = s1.filter(
             ee.Filter.eq('orbitProperties_pass', 'DESCENDING'))
         s1_asc = s1.filter(
             ee.Filter.eq('orbitProperties_pass', 'ASCENDING'))
 
-        data_dict[key].append(s1_desc)
-        data_dict[key].append(s1_asc)
+        for key in group:
+            data_dict[key].s1_desc = s1_desc
+            data_dict[key].s1_asc = s1_asc
 
     return data_dict
 
 
+def _s1_collection():
+    """Returns the Sentinel-1 GRD collection (IW mode, VV & VH
+    polarisation) without any spatial or temporal filter.
+    """
+    pol_vv = ee.Filter.listContains('transmitterReceiverPolarisation', 'VV')
+    pol_vh = ee.Filter.listContains('transmitterReceiverPolarisation', 'VH')
+    mode = ee.Filter.eq('instrumentMode', 'IW')
+
+    return ee.ImageCollection('COPERNICUS/S1_GRD') \
+        .filter(pol_vv) \
+        .filter(pol_vh) \
+        .filter(mode)
+
+
+def _coverage(sm_data, margin_days=0):
+    """Returns the time window covered by the soil moisture data of one or
+    more stations, extended by margin_days on both sides. Stations without
+    soil moisture data (e.g. outside of the import window) don't
+    contribute to the window.
+
+    :param sm_data: ISMN soil moisture data (indexed by date) or a list of
+    them (the window covers all of them).
+        :type: pandas.DataFrame or list of pandas.DataFrame
+    :param margin_days: (optional) See get_s1_backscatter().
+        :type: int or None
+
+    :return: Tuple (start, end) of (UTC) datetimes, end is exclusive.
+    (None, None) if margin_days is None (no temporal filter). None if
+    there is no soil moisture data at all, i.e. no scene could be matched.
+    """
+    if not isinstance(sm_data, list):
+        sm_data = [sm_data]
+
+    if margin_days is None:
+        return None, None
+
+    sm_data = [df for df in sm_data if df is not None and len(df.index)]
+    if not sm_data:
+        return None
+
+    starts = []
+    ends = []
+    for df in sm_data:
+        index = df.index
+        if index.tz is not None:
+            index = index.tz_convert("UTC").tz_localize(None)
+        starts.append(index.min().to_pydatetime())
+        ends.append(index.max().to_pydatetime())
+
+    margin = datetime.timedelta(days=margin_days)
+    start = min(starts) - margin
+    end = max(ends) + margin + datetime.timedelta(seconds=1)
+
+    return start, end
+
+
+def _get_s1_backscatter_batch(data_dict, batch_size, executor,
+                              cache_dir=None, margin_days=0, groups=None,
+                              journal=None):
+    """Extracts the backscatter timeseries of batch_size stations at a time.
+    For each chunk of stations, all S-1 scenes covering at least one of the
+    stations are reduced against the station geometries in a single
+    server-side computation (see _reduce_stations()). The resulting table
+    is fetched in date windows of the S-1 collection of each orbit (see
+    _fetch_windows()) that contain at most _MAX_FEATURES // batch_size
+    scenes, so that no request exceeds the element limit even if every
+    scene covers all stations of the chunk. The table is split back into
+    one dataframe per station and orbit. Only scenes within the time
+    window of each station (see _coverage()) are reduced. If a cache is
+    used, only scenes outside of the cached range of each station and
+    orbit (see cache.cached_range()) are reduced. Only the first station
+    of each location group is extracted; the result is added to all
+    stations of the group. Groups without soil moisture data aren't
+    extracted at all.
+
+    For parameter description see: get_s1_backscatter()
+
+    :return: data_dict with added dataframes containing backscatter
+    timeseries (both descending & ascending).
+    """
+    if groups is None:
+        groups = [[key] for key in data_dict.keys()]
+
+    keys = []
+    members = {}
+    for group in groups:
+        if data_dict[group[0]].geometry is None:
+            print("A GEE geometry object is missing for: "
+                  + str(group[0]))
+        elif _coverage([data_dict[key].sm_data for key in group],
+                       margin_days) is None:
+            # No soil moisture data to match, no request.
+            for key in group:
+                data_dict[key].backscatter_desc = None
+                data_dict[key].backscatter_asc = None
+            if journal is not None:
+                journal.record_backscatter(group, [None, None])
+        else:
+            keys.append(group[0])
+            members[group[0]] = group
+
+    orbits = ("DESCENDING", "ASCENDING")
+
+    def _extract_chunk(chunk):
+        geometries = [data_dict[key].geometry for key in chunk]
+        windows = [_coverage([data_dict[k].sm_data for k in members[key]],
+                             margin_days) for key in chunk]
+        starts = [start for start, end in windows]
+        ends = [end for start, end in windows]
+        cached = {}
+        skips = {}
+
+        for orbit in orbits:
+            skips[orbit] = []
+            for key, geometry in zip(chunk, geometries):
+                if cache_dir is not None:
+                    cached[(key, orbit)] = cache.load(
+                        cache_dir, cache.cache_key(geometry, orbit))
+                skips[orbit].append(
+                    cache.cached_range(cached.get((key, orbit))))
+
+        grouped = {}
+        max_scenes = max(_MAX_FEATURES // len(chunk), 1)
+
+        for orbit in orbits:
+            s1, stations = _station_collections(chunk, geometries, orbit,
+                                                starts, ends, skips[orbit])
+
+            def _fetch(img_collection, stations=stations):
+                return _decode_features(executor.get_info(
+                    _reduce_stations(img_collection, stations)))
+
+            decoded = _fetch_windows(s1, _fetch, executor,
+                                     max_scenes=max_scenes)
+            grouped.update(((key, orbit), out) for key, out
+                           in decoded.groupby("key", sort=False))
+
+        s1_data = {}
+        for key, geometry, start in zip(chunk, geometries, starts):
+            for orbit in orbits:
+                out = grouped.get((key, orbit))
+                df = None if out is None else \
+                    out[["VH", "VV", "angle", "id"]].sort_index(axis=0)
+                df = cache.update(cached.get((key, orbit)), df, start)
+
+                if df is not None and cache_dir is not None:
+                    cache.save(cache_dir, cache.cache_key(geometry, orbit),
+                               df)
+
+                s1_data[(key, orbit)] = df
+
+            if journal is not None:
+                journal.record_backscatter(members[key],
+                                           [s1_data[(key, orbit)]
+                                            for orbit in orbits])
+
+        return s1_data
+
+    chunks = [keys[i:i + batch_size] for i in range(0, len(keys), batch_size)]
+
+    for chunk, s1_data in zip(chunks, executor.map(_extract_chunk, chunks)):
+        for key in chunk:
+            for orbit in orbits:
+                df = s1_data[(key, orbit)]
+
+                if df is None:
+                    print(str(key) + ": Image collection of the "
+                          + orbit.lower() + " track is empty.\n No "
+                                            "backscatter data was extracted.")
+
+            for member in members[key]:
+                data_dict[member].backscatter_desc = \
+                    s1_data[(key, "DESCENDING")]
+                data_dict[member].backscatter_asc = \
+                    s1_data[(key, "ASCENDING")]
+
+    return data_dict
+
+
+def _station_collections(keys, geometries, orbit, starts=None, ends=None,
+                         skips=None):
+    """Returns the S-1 collection of one orbit that contains every scene
+    that has to be reduced for at least one of the stations, and the
+    stations as feature collection (properties key, start, end, skip_from
+    and skip_to, see _reduce_image_for()).
+
+    :param keys: Dictionary keys of the stations.
+        :type: List of String
+    :param geometries: Geometry objects of the stations.
+        :type: List of ee.geometry.Geometry
+    :param orbit: "DESCENDING" or "ASCENDING".
+        :type: String
+    :param starts: (optional) List of start dates (one per station, None
+    for no limit). Only scenes acquired at or after the start date of a
+    station are reduced.
+        :type: List of datetime.datetime
+    :param ends: (optional) List of end dates (one per station, None for
+    no limit). Only scenes acquired before the end date of a station are
+    reduced.
+        :type: List of datetime.datetime
+    :param skips: (optional) List of cached ranges of this orbit (one per
+    station, see cache.cached_range(), None if nothing is cached). Scenes
+    within the cached range of a station are not reduced.
+        :type: List of tuples
+
+    :return: Tuple (ee.ImageCollection, ee.FeatureCollection)
+    """
+    if starts is None:
+        starts = [None] * len(keys)
+    if ends is None:
+        ends = [None] * len(keys)
+    if skips is None:
+        skips = [None] * len(keys)
+
+    stations = ee.FeatureCollection(
+        [ee.Feature(geo, dict({"key": key, "start": _millis(start),
+                               "end": _millis(end, _MAX_MILLIS)},
+                              **_skip_properties(skip)))
+         for key, geo, start, end, skip in zip(keys, geometries, starts,
+                                               ends, skips)])
+
+    s1 = _s1_collection() \
+        .filter(ee.Filter.eq('orbitProperties_pass', orbit)) \
+        .filterBounds(stations)
+
+    firsts = [_first_needed(start, skip)
+              for start, skip in zip(starts, skips)]
+    if None not in firsts:
+        s1 = s1.filter(_acquired_from(min(firsts)))
+    if None not in ends:
+        s1 = s1.filter(_acquired_before(max(ends)))
+
+    return s1, stations
+
+
+def _reduce_stations(img_collection, stations):
+    """Reduces every S-1 scene of an image collection against all stations
+    (see _station_collections()) it has to be reduced for. Point
+    geometries result in the value of the pixel containing the point,
+    polygons in the mean value of the region (both at 10 m scale). Like in
+    _columns_of(), results without a valid value (e.g. masked pixels) are
+    left out.
+
+    :return: ee.FeatureCollection with one feature (without geometry) per
+    station and scene. Properties: key, id, time (system:time_start),
+    orbit, VV, VH, angle.
+    """
+    return img_collection.map(_reduce_image_for(stations)).flatten() \
+        .filter(ee.Filter.notNull(["VV", "VH", "angle"])) \
+        .select(["key", "id", "time", "orbit", "VV", "VH", "angle"], None,
+                False)
+
+
+def _decode_features(fc):
+    """Converts the output of _reduce_stations() (fetched) to a dataframe
+    (see _get_s1_date()) with an additional column key.
+    """
+    table = pd.DataFrame([f["properties"] for f in fc["features"]],
+                         columns=["key", "id", "time", "VV", "VH", "angle"])
+    df = _get_s1_date(table)
+    df["key"] = table["key"].values
+
+    return df
+
+
+def _skip_properties(skip):
+    """Returns the cached range of a station (see cache.cached_range()) as
+    properties "skip_from" and "skip_to" (in milliseconds, an empty range
+    if nothing is cached).
+    """
+    if skip is None:
+        return {"skip_from": 0, "skip_to": 0}
+
+    return {"skip_from": _millis(skip[0]), "skip_to": _millis(skip[1])}
+
+
+def _first_needed(start, skip):
+    """Returns the acquisition date from which on scenes have to be
+    reduced for a station with the time window start and the cached range
+    skip (None: from the beginning of the archive).
+    """
+    if skip is None:
+        return start
+
+    skip_from, skip_to = skip
+    if skip_from is not None and (start is None or start < skip_from):
+        return start
+
+    return skip_to if start is None else max(start, skip_to)
+
+
+def _reduce_image_for(stations):
+    """Returns a function that reduces a single S-1 image against all
+    stations (feature collection) it covers, whose time window (properties
+    "start" and "end", in milliseconds) contains the acquisition and whose
+    cached range ("skip_from" and "skip_to") doesn't.
+    """
+
+    def _reduce_image(image):
+        time_start = image.get("system:time_start")
+        covered = stations.filterBounds(image.geometry()) \
+            .filter(ee.Filter.lte("start", time_start)) \
+            .filter(ee.Filter.gt("end", time_start)) \
+            .filter(ee.Filter.Or(ee.Filter.gt("skip_from", time_start),
+                                 ee.Filter.lte("skip_to", time_start)))
+        fc = image.select(["VV", "VH", "angle"]) \
+            .reduceRegions(collection=covered, reducer=ee.Reducer.mean(),
+                           scale=10)
+
+        return fc.map(lambda f: f.set({
+            "id": image.get("system:index"),
+            "time": time_start,
+            "orbit": image.get("orbitProperties_pass")}))
+
+    return _reduce_image
+
+
+def _millis(date, default=0):
+    """Converts a (UTC) datetime to milliseconds since 1970-01-01, the unit
+    of 'system:time_start'. None is converted to default.
+    """
+    if date is None:
+        return default
+
+    return (date - datetime.datetime(1970, 1, 1)) \
+        // datetime.timedelta(milliseconds=1)
+
+
 def _get_s1_date(out):
-    """ Obtains the SAR image acquisition date from the product ID
+    """ Obtains the SAR image acquisition date from system:time_start
     Args:
-        out (List of dictionaries): Each dictionary corresponds to the
-        sentinel1 info of an image
+        out (pandas.DataFrame or List of dictionaries): Table with the
+        columns id, time (system:time_start in milliseconds), VH, VV and
+        angle. Each row corresponds to the sentinel1 info of an image
     Returns:
-        Dates : A list of the acquisition dates
+        DataFrame with the columns VH, VV and angle (float) and id (the
+        scene's system:index, used by visualization.show_s1()), indexed
+        by the acquisition dates
 
     @author: Cristian Silva (crisj)
     Modified by: Marco Wolsza (maawoo)
     """
-    dates = np.zeros(len(out)).tolist()
-    vh = np.zeros(len(out)).tolist()
-    vv = np.zeros(len(out)).tolist()
-    angle = np.zeros(len(out)).tolist()
-    df = pd.DataFrame()
-
-    for i in range(len(out)):
-        a = out[i]['id']
-        b = a.split(sep='_')
-        b2 = b[4].replace('T', ' ')
-        dates[i] = datetime.datetime.strptime(b2, "%Y%m%d %H%M%S")
-        vh[i] = out[i]['VH']
-        vv[i] = out[i]['VV']
-        angle[i] = out[i]['angle']
-
-    df['Dates'] = dates
-    df['VH'] = vh
-    df['VV'] = vv
-    df['angle'] = angle
-    df.set_index('Dates', inplace=True)
+    table = pd.DataFrame(out)
+    dates = pd.to_datetime(table["time"].astype("int64"), unit="ms")
+
+    df = table[["VH", "VV", "angle"]].astype(float)
+    df["id"] = table["id"].astype(str).values
+    df.index = pd.DatetimeIndex(dates.values, name="Dates")
 
     return df
 
 
-def _simplify(fc):
-    """Take a feature collection, as returned by mapping a reducer to an
-    ImageCollection, and reshape it into a simpler list of dictionaries
-    Args:
-        fc (dict): Dictionary representation of a feature collection,
-        as returned by mapping a reducer to an ImageCollection
-    Returns:
-        list: A list of dictionaries.
+def _columns_of(img_collection, geometry, scale=None):
+    """Reduces every image of an image collection (VV, VH and angle band)
+    against a geometry (mean value, at scale meters or at the native
+    resolution) and returns the results as one list per column in the
+    order of _COLUMNS:
 
-    @author: Cristian Silva (crisj)
+        {"list": [[id, ...], [time, ...], [VV, ...], [VH, ...],
+                  [angle, ...]]}
+
+    Only these values are sent back, without feature or geometry wrappers.
+    Images without a valid value (e.g. masked pixels) are left out, which
+    also keeps the columns aligned.
+
+    :return: ee.List (the "list" element of the output above)
     """
+    def _reduce_image(image):
+        """Spatial aggregation function for a single image and a point or
+        polygon feature
 
-    def _feature2dict(f):
-        id = f['id']
-        out = f['properties']
-        out.update(id=id)
-        return out
+        @author: Cristian Silva (crisj)
+        Modified by: Marco Wolsza (maawoo)
+        """
+        values = image.select(["VV", "VH", "angle"]) \
+            .reduceRegion(ee.Reducer.mean(), geometry, scale)
+
+        # Feature needs to be rebuilt because the backend
+        # doesn't accept to map functions that return dictionaries.
+        return ee.Feature(None, values).set({
+            "id": image.get("system:index"),
+            "time": image.get("system:time_start")})
+
+    return img_collection.map(_reduce_image) \
+        .filter(ee.Filter.notNull(["VV", "VH", "angle"])) \
+        .reduceColumns(ee.Reducer.toList().repeat(len(_COLUMNS)), _COLUMNS) \
+        .get("list")
 
-    out = [_feature2dict(x) for x in fc['features']]
 
-    return out
+def _decode_columns(columns):
+    """Converts the output of _columns_of() to a dataframe (see
+    _get_s1_date()).
+    """
+    return _get_s1_date(dict(zip(_COLUMNS, columns)))
+
 
+def _collection_info(img_collection):
+    """Returns the number of images of an image collection and the first
+    and last system:time_start (one request when fetched).
+    """
+    return ee.Dictionary({
+        "size": img_collection.size(),
+        "start": img_collection.aggregate_min("system:time_start"),
+        "end": img_collection.aggregate_max("system:time_start")})
+
+
+def _fetch_windows(img_collection, fetch, executor, info=None,
+                   max_scenes=_MAX_SCENES):
+    """Fetches the timeseries of an image collection (fetch(collection)
+    returns a dataframe, see _get_s1_date()) in date windows of about
+    max_scenes images. The windows are fetched in parallel via executor. A
+    window whose request fails because it is too large (see _too_large()),
+    e.g. in dense parts of the S-1 archive, is split in half and fetched
+    again (without retrying the window itself). Collections with at most
+    max_scenes images are fetched with a single request.
+
+    :param info: (optional) Output of _collection_info(). Fetched if not
+    given.
+        :type: Dictionary
+
+    :return: Dataframe of all windows, sorted by date, without duplicate
+    rows (e.g. every scene (id) only once).
+    """
+    if info is None:
+        info = executor.get_info(_collection_info(img_collection))
+
+    if info["size"] <= max_scenes:
+        windows = [None]
+    else:
+        n = -(-info["size"] // max_scenes)
+        edges = [info["start"] + (info["end"] + 1 - info["start"]) * i // n
+                 for i in range(n + 1)]
+        windows = list(zip(edges[:-1], edges[1:]))
+
+    def _fetch_window(window):
+        if window is None:
+            collection = img_collection
+            if info["size"] > 0:
+                window = (info["start"], info["end"] + 1)
+        else:
+            collection = img_collection.filterDate(*window)
+        splittable = window is not None \
+            and window[1] - window[0] > _MIN_WINDOW
 
-def _time_series_of_a_point(img_collection, point):
+        try:
+            # Too large windows are split instead of being sent again by
+            # the executor.
+            with executor.no_retry_on(_too_large if splittable
+                                      else lambda error: False):
+                return [fetch(collection)]
+        except Exception as error:
+            if not _too_large(error) or not splittable:
+                raise
+
+            middle = window[0] + (window[1] - window[0]) // 2
+            halves = executor.map(_fetch_window, [(window[0], middle),
+                                                  (middle, window[1])])
+
+            return halves[0] + halves[1]
+
+    frames = [df for dfs in executor.map(_fetch_window, windows)
+              for df in dfs]
+    df = pd.concat(frames) if len(frames) > 1 else frames[0]
+    df = df[~df.duplicated(keep="first").values]
+
+    return df.sort_index(axis=0, kind="mergesort")
+
+
+def _too_large(error):
+    """Checks if a request failed because it was too large (see
+    _TOO_LARGE_MESSAGES).
+    """
+    message = str(error).lower()
+
+    return any(part in message for part in _TOO_LARGE_MESSAGES)
+
+
+def _time_series_of_a_point(img_collection, point, executor=None,
+                            info=None):
     """Returns backscatter values for a specific coordinate (point) for each
-    image in an image collection (img_collection).
+    image in an image collection (img_collection). The requests are sent
+    via executor (default: executor.get_executor()). Long timeseries are
+    fetched in date windows (see _fetch_windows(), info: output of
+    _collection_info()).
 
     @author: Cristian Silva (crisj)
     Modified by: Marco Wolsza (maawoo)
     """
-    l = img_collection.filterBounds(point).getRegion(point, 10).getInfo()
-    out = [dict(zip(l[0], values)) for values in l[1:]]
-    df = _get_s1_date(out)
-    df = df.sort_index(axis=0)
+    if executor is None:
+        executor = get_executor()
 
-    return df
+    def _fetch(collection):
+        return _decode_columns(executor.get_info(_columns_of(collection,
+                                                             point, 10)))
+
+    return _fetch_windows(img_collection.filterBounds(point), _fetch,
+                          executor, info)
 
 
-def _time_series_of_a_region(img_collection, geometry):
+def _time_series_of_a_region(img_collection, geometry, executor=None,
+                             info=None):
     """Returns mean backscatter values for a specific polygon (geometry) for
-    each image in an image collection (img_collection).
+    each image in an image collection (img_collection). The requests are
+    sent via executor (default: executor.get_executor()). Long timeseries
+    are fetched in date windows (see _fetch_windows(), info: output of
+    _collection_info()).
 
     @author: Cristian Silva (crisj)
     Modified by: Marco Wolsza (maawoo)
     """
+    if executor is None:
+        executor = get_executor()
 
-    def _reduce_region(image):
-        """Spatial aggregation function for a single image and a polygon
-        feature
-
-        @author: Cristian Silva (crisj)
-        Modified by: Marco Wolsza (maawoo)
-        """
-        # The reduction is specified by providing the reducer (
-        # ee.Reducer.mean()) and the geometry (a polygon coord).
-        stat_dict = image.reduceRegion(ee.Reducer.mean(), geometry)
+    def _fetch(collection):
+        return _decode_columns(executor.get_info(_columns_of(collection,
+                                                             geometry)))
 
-        # Feature needs to be rebuilt because the backend
-        # doesn't accept to map functions that return dictionaries.
-        return ee.Feature(None, stat_dict)
-
-    fc = img_collection.filterBounds(geometry).map(_reduce_region).getInfo()
-    out = _simplify(fc)
-    df = _get_s1_date(out)
-    df = df.sort_index(axis=0)
-
-    return df
+    return _fetch_windows(img_collection.filterBounds(geometry), _fetch,
+                          executor, info)
@@ -0,0 +1,280 @@
+import re
+import time
+import random
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from . import instrument
+
+# Parts of error messages (lower case) that mark a request as worth
+# retrying: quota/rate limit errors (HTTP 429) and timeouts.
+_RETRY_MESSAGES = ("too many requests", "too many concurrent", "quota",
+                   "rate limit", "rate exceeded", "timed out", "timeout",
+                   "deadline exceeded", "service unavailable")
+
+# HTTP status codes of these errors (429: too many requests, 503: service
+# unavailable). In messages, they only count as separate words, not as
+# digits of other numbers.
+_RETRY_STATUS = (429, 503)
+_RETRY_STATUS_PATTERN = re.compile(r"\b(429|503)\b")
+
+_worker = threading.local()
+_default_executor = None
+_default_lock = threading.Lock()
+
+
+def get_executor():
+    """Returns the request executor that is used by all Earth Engine
+    functions of this package, if no other executor is passed explicitly.
+    A RequestExecutor with default settings is created on first use.
+
+    :return: RequestExecutor
+    """
+    global _default_executor
+
+    with _default_lock:
+        if _default_executor is None:
+            _default_executor = RequestExecutor()
+
+    return _default_executor
+
+
+def set_executor(executor):
+    """Replaces the default request executor (see get_executor()), e.g. to
+    change the concurrency limit or the rate limit for all functions.
+
+    :param executor: New default executor.
+        :type: RequestExecutor
+    """
+    global _default_executor
+
+    with _default_lock:
+        _default_executor = executor
+
+
+def is_retryable(error):
+    """Checks if an exception was caused by a quota/rate limit or a
+    timeout, i.e. if the request might succeed when it is sent again.
+
+    :param error: Exception raised by a request.
+        :type: Exception
+
+    :return: True if the request should be retried.
+    """
+    if isinstance(error, TimeoutError):
+        return True
+
+    # e.g. googleapiclient.errors.HttpError
+    status = getattr(getattr(error, "resp", None), "status", None)
+    if status is not None and int(status) in _RETRY_STATUS:
+        return True
+
+    message = str(error).lower()
+
+    return any(part in message for part in _RETRY_MESSAGES) \
+        or _RETRY_STATUS_PATTERN.search(message) is not None
+
+
+class TokenBucket(object):
+    """Thread-safe token bucket. Tokens are refilled continuously at a
+    fixed rate up to a maximum (capacity); acquire() blocks until a token
+    is available.
+
+    :param rate: Number of tokens per second.
+        :type: float
+    :param capacity: (optional) Maximum number of tokens, i.e. the size of
+    a burst. Defaults to the rate (but at least 1).
+        :type: float
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic,
+                 sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError("The rate of a token bucket has to be greater "
+                             "than 0.")
+
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None
+                              else max(rate, 1))
+        self._tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Takes one token from the bucket. Blocks until a token is
+        available.
+        """
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens +
+                                   (now - self._last) * self.rate)
+                self._last = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self.rate
+
+            self._sleep(wait)
+
+
+class RequestExecutor(object):
+    """Sends requests (e.g. getInfo() of Earth Engine objects) with a
+    bounded thread pool. Every request passes a token bucket rate limiter
+    and is retried with exponential backoff if it fails because of a
+    quota/rate limit or a timeout (see is_retryable()).
+
+    The executor only calls the functions it is given, so it can be used
+    (and tested) with any stand-in object that provides getInfo().
+
+    :param max_workers: (optional) Maximum number of concurrent requests.
+    Use 1 to send all requests serially.
+        :type: int
+    :param rate: (optional) Maximum number of requests per second. None
+    disables the rate limit.
+        :type: float or None
+    :param burst: (optional) Number of requests that may be sent at once
+    before the rate limit applies. Defaults to the rate.
+        :type: float
+    :param max_retries: (optional) Number of retries per request.
+        :type: int
+    :param backoff: (optional) Delay before the first retry (seconds). The
+    delay is doubled for each further retry (with random jitter).
+        :type: float
+    :param max_backoff: (optional) Upper limit of the delay (seconds).
+        :type: float
+    :param retry_on: (optional) Function that decides if an exception
+    should be retried. Defaults to is_retryable().
+        :type: callable
+    """
+
+    def __init__(self, max_workers=4, rate=10, burst=None, max_retries=5,
+                 backoff=1.0, max_backoff=60.0, retry_on=is_retryable,
+                 clock=time.monotonic, sleep=time.sleep):
+        if max_workers < 1:
+            raise ValueError("max_workers has to be at least 1.")
+
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_on = retry_on
+        self._sleep = sleep
+        self._bucket = None if rate is None else TokenBucket(
+            rate, burst, clock=clock, sleep=sleep)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def call(self, fn, *args, **kwargs):
+        """Calls fn(*args, **kwargs) in the current thread, respecting the
+        rate limit and retrying on quota/rate limit errors and timeouts.
+
+        The request is recorded in the active report (see instrument).
+
+        :return: Return value of fn.
+        """
+        attempt = 0
+        start = time.perf_counter()
+        no_retry = getattr(_worker, "no_retry", None)
+        if no_retry is not None and no_retry[0] is not self:
+            no_retry = None
+
+        while True:
+            if self._bucket is not None:
+                self._bucket.acquire()
+
+            try:
+                value = fn(*args, **kwargs)
+            except Exception as error:
+                if attempt >= self.max_retries or not self.retry_on(error) \
+                        or (no_retry is not None and no_retry[1](error)):
+                    instrument.record_call(time.perf_counter() - start,
+                                           retries=attempt, error=True)
+                    raise
+
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+                self._sleep(delay * random.uniform(0.5, 1.0))
+                attempt += 1
+            else:
+                instrument.record_call(time.perf_counter() - start, value,
+                                       retries=attempt)
+                return value
+
+    @contextmanager
+    def no_retry_on(self, condition):
+        """Requests that the current thread sends via this executor within
+        the with block aren't retried if condition(error) is True, e.g.
+        errors that would fail again on every retry:
+
+            with executor.no_retry_on(earthengine._too_large):
+                ...
+
+        :param condition: Function that is called with the exception.
+            :type: callable
+        """
+        previous = getattr(_worker, "no_retry", None)
+        _worker.no_retry = (self, condition)
+        try:
+            yield
+        finally:
+            _worker.no_retry = previous
+
+    def get_info(self, ee_object):
+        """Calls getInfo() of an Earth Engine object via call().
+
+        :return: Client-side value of ee_object.
+        """
+        return self.call(ee_object.getInfo)
+
+    def map(self, fn, iterable):
+        """Applies fn to every item of iterable using the thread pool and
+        returns the results in the order of iterable. The first exception
+        of a task is raised and tasks that haven't started yet are
+        cancelled.
+
+        If map() is called from within a task of this executor, the items
+        are processed serially in the calling thread. Nested calls
+        therefore can't exhaust the thread pool.
+
+        :return: List of results.
+        """
+        items = list(iterable)
+
+        if self.max_workers == 1 or len(items) < 2 \
+                or getattr(_worker, "executor", None) is self:
+            return [fn(item) for item in items]
+
+        def _task(item):
+            _worker.executor = self
+            try:
+                return fn(item)
+            finally:
+                _worker.executor = None
+
+        futures = [self._get_pool().submit(_task, item) for item in items]
+
+        try:
+            return [future.result() for future in futures]
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def shutdown(self):
+        """Shuts the thread pool down. It is recreated if the executor is
+        used again.
+        """
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers)
+
+        return self._pool
@@ -0,0 +1,271 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+_active_report = None
+_local = threading.local()
+
+# CPU time of the current thread (Python 3.7+), otherwise of the process.
+_thread_time = getattr(time, "thread_time", time.process_time)
+
+_METRICS = ("seconds", "cpu_seconds", "calls", "call_seconds", "bytes",
+            "retries", "errors")
+
+
+class Report(object):
+    """Collects runtime metrics of the workflow per stage (e.g. lc_filter)
+    and per station within a stage:
+
+        - seconds: Wall time
+        - cpu_seconds: CPU time (per stage: of the process and of the worker
+        processes that finished within the stage, per station: of the
+        thread that processed the station, of the process on Python 3.6)
+        - calls: Number of Earth Engine requests (getInfo() calls)
+        - call_seconds: Wall time spent in these requests
+        - bytes: Size of the responses (JSON encoded)
+        - retries: Number of retried requests (see executor.RequestExecutor)
+        - errors: Number of requests that failed after all retries
+
+    A report is only filled while it is active (see recording()). Hooks are
+    called with a dictionary for every event: {"event": "call" | "stage" |
+    "station", "stage": ..., "station": ..., <metrics>}. Hooks can be
+    called from several threads at once.
+
+    :param hooks: (optional) Functions that are called with each event.
+        :type: List of callable
+    """
+
+    def __init__(self, hooks=None):
+        self.hooks = list(hooks or [])
+        self.stages = {}
+        self.stations = {}
+        # Current stage of the thread that activated the report (see
+        # set_report()), which also applies to threads it started. Other
+        # threads keep their own stages in _local.
+        self._stage = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        """Adds a function that is called with each event."""
+        self.hooks.append(hook)
+
+    def to_records(self):
+        """Returns all metrics as a list of dictionaries (one per stage and
+        one per station and stage; station is None for the stage totals).
+        """
+        with self._lock:
+            records = [dict(stage=stage, station=None, **metrics)
+                       for stage, metrics in self.stages.items()]
+            records += [dict(stage=stage, station=key, **metrics)
+                        for (stage, key), metrics in self.stations.items()]
+
+        return records
+
+    def to_dataframe(self):
+        """Returns all metrics (see to_records()) as pandas.DataFrame."""
+        import pandas as pd
+
+        return pd.DataFrame(self.to_records(),
+                            columns=("stage", "station") + _METRICS)
+
+    def summary(self):
+        """Returns a table of the stage totals as String."""
+        lines = ["%-20s %10s %10s %7s %10s %12s %7s %6s"
+                 % (("stage",) + _METRICS)]
+
+        with self._lock:
+            for stage, m in self.stages.items():
+                lines.append("%-20s %10.3f %10.3f %7d %10.3f %12d %7d %6d"
+                             % ((stage,) + tuple(m[k] for k in _METRICS)))
+
+        return "\n".join(lines)
+
+    def _add(self, stage, key, event, totals=True, **values):
+        with self._lock:
+            targets = []
+            if totals:
+                targets.append(self.stages.setdefault(stage, _new_metrics()))
+            if key is not None:
+                targets.append(self.stations.setdefault((stage, key),
+                                                        _new_metrics()))
+            for metrics in targets:
+                for name, value in values.items():
+                    metrics[name] += value
+
+        if self.hooks:
+            event = dict(event=event, stage=stage, station=key, **values)
+            for hook in self.hooks:
+                hook(event)
+
+
+def _new_metrics():
+    return {name: 0 for name in _METRICS}
+
+
+def get_report():
+    """Returns the active report or None (see recording())."""
+    return _active_report
+
+
+def set_report(report):
+    """Activates a report (None deactivates the instrumentation).
+
+    :param report: Report that is filled from now on.
+        :type: Report or None
+    """
+    global _active_report
+    if report is not None:
+        report._thread = threading.get_ident()
+    _active_report = report
+
+
+@contextmanager
+def recording(hooks=None, report=None):
+    """Activates a report for the duration of a with block:
+
+        with instrument.recording() as report:
+            data_dict = preprocess.data_import()
+            ...
+        print(report.summary())
+
+    :param hooks: (optional) See Report.
+        :type: List of callable
+    :param report: (optional) Report to fill. Defaults to a new Report.
+        :type: Report
+
+    :return: The active report.
+    """
+    if report is None:
+        report = Report(hooks)
+    elif hooks:
+        report.hooks.extend(hooks)
+
+    previous = get_report()
+    set_report(report)
+    try:
+        yield report
+    finally:
+        set_report(previous)
+
+
+@contextmanager
+def stage(name):
+    """Measures a stage of the workflow. Requests and stations within the
+    stage are attributed to it. Can also be used as a decorator. Stages
+    are tracked per thread; in threads without a stage of their own, the
+    stage of the thread that activated the report applies.
+
+    :param name: Name of the stage.
+        :type: String
+    """
+    report = get_report()
+
+    if report is None:
+        yield
+        return
+
+    owner = report._thread == threading.get_ident()
+    previous = getattr(_local, "stage", None)
+    previous_shared = report._stage
+    _local.stage = name
+    if owner:
+        report._stage = name
+    start = time.perf_counter()
+    cpu_start = _cpu_time()
+    try:
+        yield
+    finally:
+        _local.stage = previous
+        if owner:
+            report._stage = previous_shared
+        report._add(name, None, "stage",
+                    seconds=time.perf_counter() - start,
+                    cpu_seconds=_cpu_time() - cpu_start)
+
+
+@contextmanager
+def station(key, stage_name=None):
+    """Measures the processing of a single station within the current
+    stage (or stage_name). Requests sent by the same thread are attributed
+    to the station.
+
+    :param key: Dictionary key of the station.
+        :type: String
+    :param stage_name: (optional) Name of the stage. Defaults to the
+    current stage.
+        :type: String
+    """
+    report = get_report()
+
+    if report is None:
+        yield
+        return
+
+    name = stage_name if stage_name is not None \
+        else _current_stage(report)
+    previous = getattr(_local, "station", None)
+    _local.station = (name, key)
+    start = time.perf_counter()
+    cpu_start = _thread_time()
+    try:
+        yield
+    finally:
+        _local.station = previous
+        report._add(name, key, "station", totals=False,
+                    seconds=time.perf_counter() - start,
+                    cpu_seconds=_thread_time() - cpu_start)
+
+
+def record_call(seconds, value=None, retries=0, error=False):
+    """Records an Earth Engine request in the active report (if any).
+
+    :param seconds: Wall time of the request (including retries).
+        :type: float
+    :param value: (optional) Response; its JSON encoded size is recorded.
+    :param retries: (optional) Number of retries.
+        :type: int
+    :param error: (optional) True if the request failed.
+        :type: bool
+    """
+    report = get_report()
+
+    if report is None:
+        return
+
+    current = getattr(_local, "station", None)
+    if current is None:
+        name, key = _current_stage(report), None
+    else:
+        name, key = current
+
+    report._add(name, key, "call", calls=1, call_seconds=seconds,
+                bytes=_payload_size(value), retries=retries,
+                errors=int(error))
+
+
+def _current_stage(report):
+    """Stage of the current thread (see stage())."""
+    name = getattr(_local, "stage", None)
+
+    return report._stage if name is None else name
+
+
+def _cpu_time():
+    """CPU time of the process and its terminated child processes."""
+    times = os.times()
+
+    return times.user + times.system + times.children_user \
+        + times.children_system
+
+
+def _payload_size(value):
+    if value is None:
+        return 0
+
+    try:
+        return len(json.dumps(value))
+    except (TypeError, ValueError):
+        return 0
@@ -0,0 +1,208 @@
+import os
+import json
+import hashlib
+import threading
+from . import cache
+
+JOB_DIR = "./data/Job/"
+
+_ORBITS = ("DESCENDING", "ASCENDING")
+
+
+class Journal(object):
+    """Progress journal of a resumable run (see pipeline.run_job()). Every
+    finished step is appended to <job_dir>/journal.jsonl as soon as it is
+    done:
+
+        {"type": "landcover", "key": ..., "value": ...}
+        {"type": "backscatter", "key": ..., "orbit": ..., "file": ...}
+
+    The backscatter timeseries themselves are stored next to the journal
+    (<job_dir>/backscatter/, see cache.save()); "file" is None if the image
+    collection was empty. Lines are flushed to disk one by one, so after a
+    crash only the steps that were in progress are lost. A line that was
+    cut off by a crash is ignored when the journal is loaded.
+
+    The parameters of the run are written to the first line. Opening the
+    journal with different parameters raises a ValueError, because the
+    recorded results wouldn't match the new run.
+
+    :param job_dir: (optional) Directory of the journal.
+        :type: String
+    :param params: (optional) Parameters of the run (JSON serializable).
+        :type: Dictionary
+    """
+
+    def __init__(self, job_dir=JOB_DIR, params=None):
+        self.job_dir = job_dir
+        self.path = os.path.join(job_dir, "journal.jsonl")
+        self.landcover = {}
+        self._backscatter = {}
+        self._lock = threading.Lock()
+        # Tuples are read back as lists.
+        self._params = json.loads(json.dumps(params))
+
+        exists, recorded = self._load()
+
+        if exists and params is not None and recorded != self._params:
+            raise ValueError("The journal in " + str(job_dir) + " belongs "
+                             "to a run with different parameters: "
+                             + str(recorded) + "\n Use another job_dir or "
+                             "delete the directory to start over.")
+
+    def done(self, key):
+        """Returns True if the backscatter of both orbits of a station was
+        recorded.
+        """
+        return all((key, orbit) in self._backscatter for orbit in _ORBITS)
+
+    def backscatter(self, key):
+        """Loads the recorded backscatter of a station.
+
+        :return: List with the descending and ascending dataframe (None for
+        an empty image collection) or None if the station isn't done.
+        """
+        if not self.done(key):
+            return None
+
+        return [None if self._backscatter[(key, orbit)] is None
+                else cache.load(self._s1_dir(),
+                                self._backscatter[(key, orbit)])
+                for orbit in _ORBITS]
+
+    def record_landcover(self, items):
+        """Records landcover classes.
+
+        :param items: Tuples (dictionary key, landcover class).
+            :type: Iterable of tuples
+        """
+        entries = [{"type": "landcover", "key": key, "value": value}
+                   for key, value in items]
+        self._append(entries)
+
+        with self._lock:
+            for entry in entries:
+                self.landcover[entry["key"]] = entry["value"]
+
+    def record_backscatter(self, keys, s1_data):
+        """Records the backscatter of one location for all of its stations.
+        The timeseries are stored once and shared by the stations.
+
+        :param keys: Dictionary keys of the stations (see
+        cluster.group_locations()).
+            :type: List of String
+        :param s1_data: Descending and ascending dataframe (None for an
+        empty image collection).
+            :type: List of pandas.DataFrame
+        """
+        entries = []
+
+        for orbit, df in zip(_ORBITS, s1_data):
+            name = None
+            if df is not None:
+                name = hashlib.sha1((keys[0] + "|" + orbit)
+                                    .encode("utf-8")).hexdigest()
+                cache.save(self._s1_dir(), name, df)
+
+            entries.extend({"type": "backscatter", "key": key,
+                            "orbit": orbit, "file": name} for key in keys)
+
+        self._append(entries)
+
+        with self._lock:
+            for entry in entries:
+                self._backscatter[(entry["key"], entry["orbit"])] = \
+                    entry["file"]
+
+    def apply(self, data_dict):
+        """Adds the recorded landcover classes and backscatter timeseries to
+        the station records of data_dict (e.g. the output of
+        preprocess.data_import()). Can be used at any time, also while
+        another process is still running the job.
+
+        :return: Dictionary of the stations whose backscatter was recorded
+        (in the order of data_dict), which can be passed to
+        postprocess.ts_filter().
+        """
+        data_dict_done = {}
+
+        for key, station in data_dict.items():
+            if key in self.landcover:
+                station.landcover = self.landcover[key]
+
+            s1_data = self.backscatter(key)
+            if s1_data is not None:
+                station.backscatter_desc, station.backscatter_asc = s1_data
+                data_dict_done[key] = station
+
+        return data_dict_done
+
+    def _s1_dir(self):
+        return os.path.join(self.job_dir, "backscatter")
+
+    def _load(self):
+        """Reads the journal. Returns a tuple (True if the journal exists,
+        parameters of the recorded run).
+        """
+        if not os.path.exists(self.path):
+            return False, None
+
+        params = None
+        with open(self.path) as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+
+                if entry["type"] == "job":
+                    params = entry["params"]
+                elif entry["type"] == "landcover":
+                    self.landcover[entry["key"]] = entry["value"]
+                elif entry["type"] == "backscatter":
+                    self._backscatter[(entry["key"], entry["orbit"])] = \
+                        entry["file"]
+
+        return True, params
+
+    def _append(self, entries):
+        if not entries:
+            return
+
+        lines = "".join(json.dumps(entry) + "\n" for entry in entries)
+
+        with self._lock:
+            if not os.path.exists(self.job_dir):
+                os.makedirs(self.job_dir, exist_ok=True)
+
+            with open(self.path, "a") as file:
+                if file.tell() == 0:
+                    file.write(json.dumps({"type": "job",
+                                           "params": self._params}) + "\n")
+                # A line cut off by an earlier crash would swallow the
+                # first new line.
+                elif not _ends_with_newline(self.path):
+                    file.write("\n")
+                file.write(lines)
+                file.flush()
+                os.fsync(file.fileno())
+
+
+def load_job(data_dict, job_dir=JOB_DIR):
+    """Loads the (partial) results of a run of pipeline.run_job() into the
+    station records of data_dict (see Journal.apply()).
+
+    :param data_dict: Output of preprocess.data_import().
+        :type: Dictionary
+    :param job_dir: (optional) Directory of the journal.
+        :type: String
+
+    :return: Dictionary of the stations with recorded backscatter.
+    """
+    return Journal(job_dir).apply(data_dict)
+
+
+def _ends_with_newline(path):
+    with open(path, "rb") as file:
+        file.seek(-1, os.SEEK_END)
+        return file.read(1) == b"\n"
@@ -0,0 +1,56 @@
+import importlib
+import threading
+
+
+class LazyModule(object):
+    """Placeholder for a module that is imported on first attribute access.
+
+    The heavy backends (earthengine-api, geehydro/folium, matplotlib, ismn)
+    are only needed by some steps of the workflow. Modules of this package
+    bind them with lazy_import(), so e.g. preprocess and postprocess can be
+    imported (and run in worker processes) without loading them at all.
+    Missing packages raise the usual ImportError when they are first used.
+    """
+
+    def __init__(self, name, requires=()):
+        self._name = name
+        self._requires = tuple(requires)
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    for name in self._requires:
+                        importlib.import_module(name)
+                    self._module = importlib.import_module(self._name)
+
+        return self._module
+
+    def __getattr__(self, attr):
+        # Only called for attributes that are not set on the placeholder.
+        if attr in ("_name", "_requires", "_module", "_lock"):
+            raise AttributeError(attr)
+
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+
+        return "<lazy module '%s' (%s)>" % (self._name, state)
+
+
+def lazy_import(name, requires=()):
+    """Returns a LazyModule for the module name.
+
+    :param name: Full name of the module (e.g. 'matplotlib.pyplot').
+        :type: String
+    :param requires: (optional) Names of modules that are imported right
+    before the module (e.g. 'geehydro', which extends folium).
+        :type: tuple of String
+
+    :return: LazyModule
+    """
+    return LazyModule(name, requires)
+
@@ -0,0 +1,144 @@
+import os
+import glob
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+MANIFEST_PATH = "./data/ISMN_Filt/manifest.csv"
+
+COLUMNS = ["path", "size", "mtime_ns", "network", "station", "latitude",
+           "longitude", "elevation", "depth_from", "depth_to", "sensor",
+           "selected"]
+
+
+def update_manifest(data_dir="./data/ISMN/", manifest_path=MANIFEST_PATH,
+                    workers=None):
+    """Creates or updates the header manifest of all ISMN soil moisture
+    files in data_dir. The manifest contains one row per file with the
+    information of its header line (network, station, coordinates,
+    elevation, depth range and sensor).
+    Only files that are new or whose size or modification time changed
+    since the last update are read. The headers are read in parallel.
+
+    :param data_dir: (optional) Directory of the ISMN files.
+        :type: String
+    :param manifest_path: (optional) Path of the manifest (CSV file).
+        :type: String
+    :param workers: (optional) Number of threads used to read the headers.
+        :type: int
+
+    :return: Manifest as pandas.DataFrame
+    """
+    files = glob.glob(os.path.join(data_dir, "**", "*_sm_*.stm"),
+                      recursive=True)
+    old = load_manifest(manifest_path)
+    known = {} if old is None else {row.path: row for row in
+                                    old.itertuples(index=False)}
+
+    rows = []
+    changed = []
+    for path in files:
+        stat = os.stat(path)
+        row = known.get(path)
+
+        if row is not None and row.size == stat.st_size \
+                and row.mtime_ns == stat.st_mtime_ns:
+            rows.append(row._asdict())
+        else:
+            changed.append((path, stat))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        rows.extend(pool.map(lambda item: _scan_file(*item), changed))
+
+    manifest = pd.DataFrame(rows, columns=COLUMNS)
+    manifest["selected"] = manifest["selected"].fillna(False).astype(bool)
+    manifest = manifest.sort_values("path").reset_index(drop=True)
+
+    if old is None or len(changed) > 0 or len(old) != len(manifest):
+        save_manifest(manifest, manifest_path)
+
+    return manifest
+
+
+def load_manifest(manifest_path=MANIFEST_PATH):
+    """Loads the header manifest.
+
+    :param manifest_path: (optional) Path of the manifest (CSV file).
+        :type: String
+
+    :return: Manifest as pandas.DataFrame or None if it doesn't exist.
+    """
+    if not os.path.exists(manifest_path):
+        return None
+
+    return pd.read_csv(manifest_path, dtype={"network": str, "station": str,
+                                             "sensor": str})
+
+
+def save_manifest(manifest, manifest_path=MANIFEST_PATH):
+    """Writes the header manifest to a CSV file.
+
+    :param manifest: Manifest (see update_manifest()).
+        :type: pandas.DataFrame
+    :param manifest_path: (optional) Path of the manifest (CSV file).
+        :type: String
+    """
+    directory = os.path.dirname(manifest_path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+
+    manifest.to_csv(manifest_path, index=False)
+
+
+def query(manifest, depth=None, sensor=None, network=None):
+    """Selects the rows of the manifest that match all given criteria.
+
+    :param manifest: Manifest (see update_manifest()).
+        :type: pandas.DataFrame
+    :param depth: (optional) Measurement depth in meters. A file matches
+    if either the upper or the lower limit of its depth range is equal to
+    depth.
+        :type: float
+    :param sensor: (optional) Sensor name or list of sensor names.
+        :type: String or list of String
+    :param network: (optional) Network name or list of network names.
+        :type: String or list of String
+
+    :return: Boolean pandas.Series (True for matching rows).
+    """
+    mask = pd.Series(True, index=manifest.index)
+
+    if depth is not None:
+        mask &= np.isclose(manifest["depth_from"], depth) \
+            | np.isclose(manifest["depth_to"], depth)
+    if sensor is not None:
+        mask &= manifest["sensor"].isin(_as_list(sensor))
+    if network is not None:
+        mask &= manifest["network"].isin(_as_list(network))
+
+    return mask
+
+
+def _scan_file(path, stat):
+    """Reads the header line of a single ISMN file (Header + values format)
+    and returns its manifest row.
+    """
+    with open(path) as file:
+        header_elements = file.readline().split()
+
+    return {"path": path,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "network": header_elements[1],
+            "station": header_elements[2],
+            "latitude": float(header_elements[3]),
+            "longitude": float(header_elements[4]),
+            "elevation": float(header_elements[5]),
+            "depth_from": float(header_elements[6]),
+            "depth_to": float(header_elements[7]),
+            "sensor": header_elements[8],
+            "selected": False}
+
+
+def _as_list(value):
+    return [value] if isinstance(value, str) else list(value)
@@ -0,0 +1,176 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .executor import get_executor
+from .store import read_files, STORE_DIR, _load_index, _save_index
+from .journal import Journal, JOB_DIR
+from .reader import window_key
+from . import preprocess, earthengine, postprocess, instrument
+
+
+def stream_stations(input_dict, landcover_ids=None, max_in_flight=8,
+                    executor=None, store_dir=STORE_DIR, processes=1,
+                    cache_dir=None, margin_days=0, variables=None,
+                    flags=None, float32=False, start=None, end=None):
+    """Runs the whole workflow (data_import() -> lc_filter() ->
+    get_s1_backscatter() -> ts_filter()) station by station and yields
+    each station as soon as it is finished.
+
+    The ISMN files selected by preprocess.data_handling() are parsed in
+    chunks of max_in_flight files while the Earth Engine requests of
+    earlier stations are running in max_in_flight worker threads. At most
+    max_in_flight stations are in progress at any time, so the memory use
+    doesn't grow with the number of stations, as long as the caller
+    doesn't keep all yielded stations. Stations are yielded in the order in
+    which they are finished; stations that don't pass the land cover
+    filter are left out. Unlike data_import(), no ./data/stations.csv is
+    written.
+
+    :param input_dict: Dictionary that was created via user input
+    through setup_pkg() (see earthengine.lc_filter()).
+        :type: Dictionary
+    :param landcover_ids: (optional) See earthengine.lc_filter().
+        :type: single int or list of int
+    :param max_in_flight: (optional) Maximum number of stations in
+    progress.
+        :type: int
+    :param executor: (optional) Executor that sends the Earth Engine
+    requests. Defaults to executor.get_executor().
+        :type: executor.RequestExecutor
+    :param store_dir: (optional) See preprocess.data_import().
+        :type: String or None
+    :param processes: (optional) Number of processes used to parse a chunk
+    of new or changed files (see store.read_files()).
+        :type: int
+    :param cache_dir: (optional) See earthengine.get_s1_backscatter().
+        :type: String
+    :param margin_days: (optional) See earthengine.get_s1_backscatter().
+        :type: int or None
+    :param variables, flags, float32, start, end: (optional) Import
+    options, see preprocess.data_import().
+
+    :return: Generator of tuples (dictionary key, station.Station) with
+    the same attributes as after postprocess.ts_filter().
+    """
+    landcover_ids = earthengine._landcover_ids(landcover_ids)
+
+    if executor is None:
+        executor = get_executor()
+
+    lc = earthengine._landcover_image()
+    sm_files = preprocess._selected_files()
+
+    def _process(key, station):
+        with instrument.station(key, "stream"):
+            return _process_station(key, station)
+
+    def _process_station(key, station):
+        data_dict = {key: station}
+
+        earthengine._ee_geometries(data_dict, input_dict)
+        station.landcover = earthengine._lc_value(lc, station.geometry,
+                                                  executor)
+        if station.landcover not in landcover_ids:
+            return None
+
+        earthengine._get_image_collection(data_dict, margin_days)
+        window = earthengine._coverage(station.sm_data, margin_days)
+        if window is not None:
+            s1_data = earthengine._extract_station(key, station, executor,
+                                                   cache_dir, window[0])
+            if s1_data is not None:
+                station.backscatter_desc, station.backscatter_asc = s1_data
+
+        postprocess.ts_filter(data_dict)
+
+        return key, station
+
+    pending = set()
+    pool = ThreadPoolExecutor(max_workers=max_in_flight)
+    # Loaded once and saved at the end instead of once per chunk.
+    index = None if store_dir is None else _load_index(store_dir)
+
+    try:
+        for i in range(0, len(sm_files), max_in_flight):
+            chunk = sm_files[i:i + max_in_flight]
+
+            if store_dir is None:
+                parsed = [preprocess._read_file(f, start, end)
+                          for f in chunk]
+            else:
+                parsed = read_files(chunk, store_dir, processes,
+                                    preprocess._columns(variables, flags),
+                                    start, end, index)
+
+            for header_elements, data in parsed:
+                data = preprocess._project(data, variables, flags, float32)
+
+                while len(pending) >= max_in_flight:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for result in _results(done):
+                        yield result
+
+                pending.add(pool.submit(_process, *preprocess._station_from(
+                    header_elements, data)))
+
+            del parsed
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for result in _results(done):
+                yield result
+    finally:
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=True)
+        if index:
+            _save_index(store_dir, index)
+
+
+def run_job(input_dict, job_dir=JOB_DIR, landcover_ids=None,
+            batch_size=None, executor=None, cache_dir=None, margin_days=0,
+            tolerance=0, footprint_cell=None, variables=None, flags=None,
+            float32=False, start=None, end=None):
+    """Runs the whole workflow (data_import() -> lc_filter() ->
+    get_s1_backscatter() -> ts_filter()) as a resumable job. The landcover
+    class and the backscatter of every station are recorded in a journal
+    in job_dir (see journal.Journal) as soon as they are available. If the
+    run is interrupted (crash, kernel restart, quota error), calling
+    run_job() again with the same arguments only processes the stations
+    that aren't recorded yet. The results recorded so far can be loaded at
+    any time with journal.load_job().
+
+    For parameter description see: earthengine.lc_filter(),
+    earthengine.get_s1_backscatter() and preprocess.data_import().
+    batch_size is only used for the backscatter extraction.
+
+    :param job_dir: (optional) Directory of the journal. A job_dir can only
+    be resumed with the same input_dict, landcover_ids, margin_days,
+    tolerance, variables, flags, start and end.
+        :type: String
+
+    :return: Dictionary of the stations that passed the land cover filter,
+    with the same attributes as after postprocess.ts_filter().
+    """
+    landcover_ids = earthengine._landcover_ids(landcover_ids)
+    params = {"box_yn": input_dict["box_yn"],
+              "box_size": input_dict["box_size"],
+              "landcover_ids": landcover_ids, "margin_days": margin_days,
+              "tolerance": tolerance, "variables": variables, "flags": flags,
+              "window": window_key(start, end)}
+    journal = Journal(job_dir, params)
+
+    data_dict = preprocess.data_import(variables=variables, flags=flags,
+                                       float32=float32, start=start, end=end)
+    data_dict = earthengine.lc_filter(data_dict, input_dict, landcover_ids,
+                                      executor=executor, journal=journal)
+    data_dict = earthengine.get_s1_backscatter(
+        data_dict, batch_size, executor, cache_dir, margin_days, tolerance,
+        footprint_cell, journal)
+    postprocess.ts_filter(data_dict)
+
+    return data_dict
+
+
+def _results(futures):
+    """Returns the (not filtered) results of finished futures."""
+    return [result for result in (future.result() for future in futures)
+            if result is not None]
@@ -1,7 +1,9 @@
 import pandas as pd
 import numpy as np
+from . import instrument
 
 
+@instrument.stage("ts_filter")
 def ts_filter(data_dict):
     """Filters the ISMN data by comparing the timestamp of each soil
     moisture measurement with the recording time of each Sentinel-1
@@ -11,116 +13,91 @@ def ts_filter(data_dict):
     for duplicate Sentinel-1 timestamps. In case of duplicates, only the
     first entry will be used.
 
+    The matching is done as a sorted as-of join: the soil moisture
+    timestamps of a station are normalized once and each S-1 timestamp is
+    located with a binary search, so both orbits are matched in a single
+    pass over the station.
+
     :param data_dict: Dictionary that was created/modified by using the
-    function get_s1_backscatter(). Must contain a dataframe for the ISMN soil
-    moisture data and dataframes for the Sentinel-1 backscatter data
-    (descending & ascending orbits) for each dictionary key.
+    function get_s1_backscatter(). Each station record must contain a
+    dataframe for the ISMN soil moisture data and dataframes for the
+    Sentinel-1 backscatter data (descending & ascending orbits).
         :type: Dictionary
 
-    :return: Dictionary with added dataframe that contains the filtered soil
-    moisture and backscatter data.
+    :return: Dictionary with added dataframes (matched_desc & matched_asc of
+    each station record) that contain the filtered soil moisture and
+    backscatter data.
     """
+    for key, station in data_dict.items():
+        with instrument.station(key):
+            timeseries_sm = _normalize_sm(station.sm_data)
+
+            for orbit in ("desc", "asc"):
+                timeseries_s1 = getattr(station, "backscatter_" + orbit)
+
+                if timeseries_s1 is None:
+                    matched = None
+                else:
+                    matched = _match_asof(timeseries_s1, timeseries_sm,
+                                          orbit)
 
-    def _filter_s1_desc(data_dict_desc):
-
-        for key in data_dict_desc.keys():
-            if data_dict_desc[key][6] is None:
-                data_dict_desc[key].append(None)
-                continue
-            else:
-                copy_sm = []
-                plotdata = []
-                timeseries_s1 = data_dict_desc[key][6]
-                timeseries_sm = data_dict_desc[key][2]
-                for timestamp in timeseries_sm.index:
-                    copy_sm.append(timestamp)
-
-                last_timestamp = None
-                for timestamp in timeseries_s1.index:
-                    if last_timestamp == timestamp:
-                        continue
-                    last_timestamp = timestamp
-                    sm_series = None
-                    result = None
-                    for sm_timestamp_index in range(len(copy_sm)):
-                        loc = copy_sm[sm_timestamp_index].tz_localize(None)
-                        if loc > timestamp:
-                            result = sm_series
-                            break
-                        sm_series = sm_timestamp_index
-
-                    if result is not None:
-                        record = {
-                            "t_s1_desc": timestamp,
-                            "VH_desc": timeseries_s1.at[timestamp, "VH"][0] \
-                                if isinstance(timeseries_s1.at[timestamp, "VH"],
-                                              np.ndarray) \
-                                else timeseries_s1.at[timestamp, "VH"],
-                            "VV_desc": timeseries_s1.at[timestamp, "VV"][0] \
-                                if isinstance(timeseries_s1.at[timestamp, "VV"],
-                                              np.ndarray) \
-                                else timeseries_s1.at[timestamp, "VV"],
-                            "t_sm": copy_sm[result].tz_localize(None),
-                            "sm": timeseries_sm.at[copy_sm[result], "soil moisture"]
-                        }
-
-                        plotdata.append(record)
-                        copy_sm = copy_sm[result:]
-
-                data_dict_desc[key].append(pd.DataFrame(data=plotdata, dtype=np.float))
-
-        return data_dict
-
-    def _filter_s1_asc(data_dict_asc):
-
-        for key in data_dict_asc.keys():
-            if data_dict_asc[key][7] is None:
-                data_dict_asc[key].append(None)
-                continue
-            else:
-                copy_sm = []
-                plotdata = []
-                timeseries_s1 = data_dict_asc[key][7]
-                timeseries_sm = data_dict_asc[key][2]
-                for timestamp in timeseries_sm.index:
-                    copy_sm.append(timestamp)
-
-                last_timestamp_asc = None
-                for timestamp in timeseries_s1.index:
-                    if last_timestamp_asc == timestamp:
-                        continue
-                    last_timestamp_asc = timestamp
-                    sm_series = None
-                    result = None
-                    for sm_timestamp_index in range(len(copy_sm)):
-                        loc = copy_sm[sm_timestamp_index].tz_localize(None)
-                        if loc > timestamp:
-                            result = sm_series
-                            break
-                        sm_series = sm_timestamp_index
-
-                    if result is not None:
-                        record = {
-                            "t_s1_asc": timestamp,
-                            "VH_asc": timeseries_s1.at[timestamp, "VH"][0] \
-                                if isinstance(timeseries_s1.at[timestamp, "VH"], np.ndarray) \
-                                else timeseries_s1.at[timestamp, "VH"],
-                            "VV_asc": timeseries_s1.at[timestamp, "VV"][0] \
-                                if isinstance(timeseries_s1.at[timestamp, "VV"], np.ndarray) \
-                                else timeseries_s1.at[timestamp, "VV"],
-                            "t_sm": copy_sm[result].tz_localize(None),
-                            "sm": timeseries_sm.at[copy_sm[result], "soil moisture"]
-                        }
-
-                        plotdata.append(record)
-                        copy_sm = copy_sm[result:]
-
-                data_dict_asc[key].append(pd.DataFrame(data=plotdata, dtype=np.float))
-
-        return data_dict
-
-    _filter_s1_desc(data_dict)
-    _filter_s1_asc(data_dict)
+                setattr(station, "matched_" + orbit, matched)
 
     return data_dict
 
+
+def _normalize_sm(timeseries_sm):
+    """Returns the soil moisture dataframe with a timezone-naive, sorted
+    index. The timezone information is dropped without conversion, just
+    like calling tz_localize(None) on each timestamp.
+    """
+    if getattr(timeseries_sm.index, "tz", None) is not None:
+        timeseries_sm = timeseries_sm.tz_localize(None)
+
+    if not timeseries_sm.index.is_monotonic_increasing:
+        timeseries_sm = timeseries_sm.sort_index(kind="mergesort")
+
+    return timeseries_sm
+
+
+def _match_asof(timeseries_s1, timeseries_sm, orbit):
+    """Pairs each (unique) Sentinel-1 timestamp with the last soil moisture
+    measurement taken at or before it. A scene is only kept if there is
+    also a soil moisture measurement after it, i.e. if the scene lies
+    within the soil moisture record.
+
+    :param timeseries_s1: Backscatter dataframe of one orbit.
+        :type: pandas.DataFrame
+    :param timeseries_sm: Soil moisture dataframe (see _normalize_sm()).
+        :type: pandas.DataFrame
+    :param orbit: Either "desc" or "asc". Used for the column names.
+        :type: String
+
+    :return: Dataframe with the columns t_s1_<orbit>, VH_<orbit>,
+    VV_<orbit>, angle_<orbit> (if the backscatter has an angle column), t_sm
+    and sm.
+    """
+    timeseries_s1 = timeseries_s1[~timeseries_s1.index.duplicated(
+        keep="first")]
+    if not timeseries_s1.index.is_monotonic_increasing:
+        timeseries_s1 = timeseries_s1.sort_index(kind="mergesort")
+
+    t_s1 = timeseries_s1.index.values
+    t_sm = timeseries_sm.index.values
+
+    # Position of the first soil moisture timestamp after each scene.
+    pos = np.searchsorted(t_sm, t_s1, side="right")
+    valid = (pos > 0) & (pos < len(t_sm))
+    pos = pos[valid] - 1
+
+    matched = {
+        "t_s1_" + orbit: t_s1[valid],
+        "VH_" + orbit: timeseries_s1["VH"].values[valid].astype(float),
+        "VV_" + orbit: timeseries_s1["VV"].values[valid].astype(float)}
+    if "angle" in timeseries_s1.columns:
+        matched["angle_" + orbit] = \
+            timeseries_s1["angle"].values[valid].astype(float)
+    matched["t_sm"] = t_sm[pos]
+    matched["sm"] = timeseries_sm["soil moisture"].values[pos].astype(float)
+
+    return pd.DataFrame(matched)
@@ -1,72 +1,112 @@
-import re
+import os
 import glob
-import shutil
 import csv
-from ismn import readers as ismn
+import pandas as pd
+from .station import Station
+from .manifest import update_manifest, load_manifest, save_manifest, query
+from .store import read_files, STORE_DIR
+from .reader import read_window
+from .lazy import lazy_import
+from . import instrument
 
+ismn = lazy_import("ismn.readers")
 
-def data_handling(measurement_depth=0.05):
-    """Uses a regular expression to filter all ISMN files in ./data/ISMN
-    for a specific measurement depth. Copies all matching files into the
-    directory ./data/ISMN_Filt , which was created using the setup_pkg()
-    function.
+
+@instrument.stage("data_handling")
+def data_handling(measurement_depth=0.05, sensor=None, workers=None):
+    """Filters all ISMN files in ./data/ISMN for a specific measurement
+    depth (and optionally sensor). The header line of each file is recorded
+    once in a manifest (./data/ISMN_Filt/manifest.csv, see
+    manifest.update_manifest()), so later calls only have to read new or
+    changed files. Matching files are marked as selected in the manifest
+    and are imported by data_import(); no files are copied.
 
     :param measurement_depth: (optional) If not specified, the default
     value of 0.05 m is used.
         :type: float
+    :param sensor: (optional) Only keep files of this sensor (or list of
+    sensors).
+        :type: String or list of String
+    :param workers: (optional) Number of threads used to read the headers.
+        :type: int
 
     """
-    depth = str(measurement_depth)
-    file_list = [f for f in glob.glob("./data/ISMN/**/*_sm_*.stm",
-                                      recursive=True)]
-    regex = r".+\d{1,2}\.\d+\s+" + re.escape(depth)
-
-    for file in file_list:
-        checked_file = open(file)
-        first = checked_file.readline()
-
-        if re.match(regex, first):
-            shutil.copy2(file, './data/ISMN_Filt/')
+    manifest = update_manifest(workers=workers)
+    manifest["selected"] = query(manifest, depth=measurement_depth,
+                                 sensor=sensor)
+    save_manifest(manifest)
 
-    file_list_filt = [f for f in glob.glob("./data/ISMN_Filt/**/*_sm_*.stm",
-                                           recursive=True)]
+    return print(str(len(manifest)) + " ISMN files were found in "
+                                      "\'./data/ISMN/\'. \n"
+                 + str(int(manifest["selected"].sum())) + " ISMN files with "
+                                                          "a measurement "
+                                                          "depth of "
+                 + str(measurement_depth) + " were selected in \'./data"
+                                            "/ISMN_Filt/manifest.csv\'")
 
-    return print(str(len(file_list)) + " ISMN files were found in "
-                                       "\'./data/ISMN/\'. \n"
-                 + str(len(file_list_filt)) + " ISMN files with a "
-                                              "measurement depth of "
-                 + str(measurement_depth) + " were copied to \'./data"
-                                            "/ISMN_Filt/\'")
 
-
-def data_import():
-    """Creates a dictionary with longitude, latitude and soil moisture data
-    as values for each ISMN file located in ./data/ISMN_Filt .
+@instrument.stage("data_import")
+def data_import(store_dir=STORE_DIR, processes=None, variables=None,
+                flags=None, float32=False, start=None, end=None):
+    """Creates a dictionary with a station record (station.Station, which
+    holds latitude, longitude and soil moisture data) for each ISMN file
+    that was selected by data_handling(). If no manifest exists, all ISMN
+    files located in ./data/ISMN_Filt are imported.
     The key of each dictionary entry is created as a combination of network
     name, station name and sensor type.
     Also a CSV file with each key and the corresponding coordinates (
     latitude & longitude) is created in the directory ./data/
 
-    :return: Dictionary containing ISMN data.
+    :param store_dir: (optional) Directory of the columnar store the parsed
+    files are kept in (see store.read_files()). Files are only parsed
+    again if they changed. If set to None, all files are parsed serially
+    without a store.
+        :type: String or None
+    :param processes: (optional) Number of processes used to parse new or
+    changed files. Defaults to the number of CPUs.
+        :type: int
+    :param variables: (optional) Columns of the ISMN data that are kept,
+    e.g. ["soil moisture"]. Defaults to all columns.
+        :type: List of String
+    :param flags: (optional) ISMN quality flags that are accepted, e.g.
+    "G" (good). Records with other flags (in the flag column of any kept
+    variable) are dropped. Defaults to all records.
+        :type: String or List of String
+    :param float32: (optional) If True, values are stored as float32
+    instead of float64 and flag columns as categoricals instead of
+    objects.
+        :type: bool
+    :param start: (optional) Only records from this date on are imported,
+    e.g. reader.S1_START (records before the first Sentinel-1 scene can't
+    be matched anyway). The files are only read from this date on (see
+    reader.read_window()).
+        :type: String or datetime
+    :param end: (optional) Only records before this date are imported.
+        :type: String or datetime
+
+    :return: Dictionary containing ISMN data (station.Station objects).
     """
-    sm_files = [f for f in glob.glob("./data/ISMN_Filt/**/*_sm_*.stm",
-                                     recursive=True)]
+    sm_files = _selected_files()
+
+    if store_dir is None:
+        parsed = [_read_file(f, start, end) for f in sm_files]
+    else:
+        parsed = read_files(sm_files, store_dir, processes,
+                            _columns(variables, flags), start, end)
 
     dict_ismn = {}
     long = []
     lat = []
     station = []
 
-    for i in sm_files:
-        data = ismn.read_data(i)
-        header_elements, filename_elements = ismn.get_info_from_file(i)
-        dict_ismn[header_elements[1] + "-" + header_elements[2] + "-" +
-                  header_elements[8]] = [header_elements[3],
-                                         header_elements[4], data.data]
+    for header_elements, data in parsed:
+        with instrument.station(_station_key(header_elements)):
+            data = _project(data, variables, flags, float32)
+            key, record = _station_from(header_elements, data)
+        dict_ismn[key] = record
         long.append(header_elements[3])
         lat.append(header_elements[4])
-        station.append(header_elements[1] + "-" + header_elements[2] + "-" +
-                       header_elements[8])
+        station.append(key)
 
     with open('./data/stations.csv', 'w', newline='') as csvfile:
         filewriter = csv.writer(csvfile, delimiter=',')
@@ -75,3 +115,128 @@ def data_import():
         filewriter.writerow(lat)
 
     return dict_ismn
+
+
+def _station_from(header_elements, data):
+    """Creates the station record of a parsed ISMN file.
+
+    :return: Tuple (dictionary key, station.Station)
+    """
+    key = _station_key(header_elements)
+
+    return key, Station(header_elements[3], header_elements[4], data,
+                        network=header_elements[1], name=header_elements[2],
+                        sensor=header_elements[8])
+
+
+def _station_key(header_elements):
+    """Returns the dictionary key (network-station-sensor) of a file."""
+    return header_elements[1] + "-" + header_elements[2] + "-" + \
+        header_elements[8]
+
+
+def _columns(variables, flags):
+    """Returns the columns that have to be read for data_import() (the
+    variables and, if flags are checked, their flag columns). None for all
+    columns.
+    """
+    if variables is None:
+        return None
+
+    columns = list(variables)
+    if flags is not None:
+        columns += [variable + "_flag" for variable in variables]
+
+    return columns
+
+
+def _project(data, variables=None, flags=None, float32=False):
+    """Applies the import options of data_import() to the data of a single
+    ISMN file: records with flags that are not accepted are dropped, only
+    the requested variables are kept and values (flag columns) are
+    downcast to float32 (categoricals). The index is stored as a sorted,
+    timezone-naive DatetimeIndex.
+
+    For parameter description see: data_import()
+
+    :return: pandas.DataFrame
+    """
+    if flags is not None:
+        flags = [flags] if isinstance(flags, str) else list(flags)
+
+        if variables is None:
+            flag_columns = [c for c in data.columns if c.endswith("_flag")
+                            and not c.endswith("_orig_flag")]
+        else:
+            flag_columns = [v + "_flag" for v in variables
+                            if v + "_flag" in data.columns]
+
+        keep = pd.Series(True, index=data.index)
+        for column in flag_columns:
+            keep &= _accepted(data[column], flags)
+        data = data[keep.values]
+
+    if variables is not None:
+        data = data[list(variables)]
+
+    if float32:
+        data = data.astype({c: "float32" for c in
+                            data.select_dtypes("float64").columns})
+        data = data.astype({c: "category" for c in
+                            data.select_dtypes("object").columns})
+
+    if not isinstance(data.index, pd.DatetimeIndex):
+        data.index = pd.DatetimeIndex(data.index)
+    if data.index.tz is not None:
+        data = data.tz_localize(None)
+    if not data.index.is_monotonic_increasing:
+        data = data.sort_index(kind="mergesort")
+
+    return data
+
+
+def _accepted(flag_column, flags):
+    """Checks for each record if its ISMN flag is accepted. Combined flags
+    (e.g. "D01,D03") are accepted if each of their flags is accepted.
+
+    :return: Boolean pandas.Series
+    """
+    flag_column = flag_column.astype(str)
+    accepted = flag_column.isin(flags)
+    combined = ~accepted & flag_column.str.contains(",", regex=False)
+
+    if combined.any():
+        accepted[combined] = [all(flag in flags for flag in value.split(","))
+                              for value in flag_column[combined]]
+
+    return accepted
+
+
+def _read_file(path, start=None, end=None):
+    """Parses a single ISMN file (only the records within the time window
+    start - end, if given).
+
+    :return: Tuple (header elements, dataframe)
+    """
+    if start is not None or end is not None:
+        return read_window(path, start, end)
+
+    data = ismn.read_data(path)
+    header_elements, filename_elements = ismn.get_info_from_file(path)
+
+    return header_elements, data.data
+
+
+def _selected_files():
+    """Returns the paths of all ISMN files that are selected in the
+    manifest or, if there is no manifest, all ISMN files located in
+    ./data/ISMN_Filt .
+    """
+    manifest = load_manifest()
+
+    if manifest is None:
+        return [f for f in glob.glob("./data/ISMN_Filt/**/*_sm_*.stm",
+                                     recursive=True)]
+
+    return [f for f in manifest.loc[manifest["selected"], "path"]
+            if os.path.exists(f)]
@@ -0,0 +1,102 @@
+import io
+import os
+import pandas as pd
+
+# First Sentinel-1 scenes in the GEE archive. Soil moisture records before
+# this date can't be matched to a scene.
+S1_START = "2014-10-03"
+
+# Size of the part of a file that is scanned line by line after the binary
+# search (bytes).
+_BLOCK = 1 << 16
+
+# Length of the timestamp at the beginning of each record ("YYYY/MM/DD
+# HH:MM"). Timestamps in this format sort like their strings.
+_STAMP = 16
+
+
+def read_window(path, start=None, end=None, variable="soil moisture"):
+    """Reads the records of an ISMN file (Header + values format) within a
+    time window, without parsing the rest of the file. The records of a
+    file are sorted by time, so the first and the last record of the window
+    are found with a binary search over the byte offsets; only the bytes in
+    between are read and parsed. Import time and memory therefore depend on
+    the length of the window instead of the length of the file.
+
+    :param path: Path of the ISMN file.
+        :type: String
+    :param start: (optional) Start of the window (inclusive, minute
+    resolution, e.g. S1_START). Defaults to the first record.
+        :type: String or datetime
+    :param end: (optional) End of the window (exclusive). Defaults to the
+    last record.
+        :type: String or datetime
+    :param variable: (optional) Name of the variable in the file.
+        :type: String
+
+    :return: Tuple (header elements, dataframe) like ismn.readers: columns
+    <variable>, <variable>_flag and <variable>_orig_flag, indexed by time.
+    """
+    with open(path, "rb") as file:
+        header = file.readline()
+        first = file.tell()
+        size = os.fstat(file.fileno()).st_size
+
+        lo = first if start is None else _seek(file, _key(start), first, size)
+        hi = size if end is None else _seek(file, _key(end), lo, size)
+
+        file.seek(lo)
+        chunk = file.read(max(hi - lo, 0))
+
+    columns = [variable, variable + "_flag", variable + "_orig_flag"]
+    data = pd.read_csv(io.BytesIO(chunk), sep=r"\s+", header=None,
+                       names=["date", "time"] + columns,
+                       usecols=range(5), dtype={variable: float})
+    data.index = pd.DatetimeIndex(
+        pd.to_datetime(data["date"] + " " + data["time"],
+                       format="%Y/%m/%d %H:%M"), name="date_time")
+
+    return header.decode("utf-8").split(), data[columns]
+
+
+def window_key(start=None, end=None):
+    """Returns a String that identifies a time window (see read_window()),
+    e.g. for the store index. "" for the whole file.
+    """
+    if start is None and end is None:
+        return ""
+
+    return "|".join("" if date is None else _key(date).decode("ascii")
+                    for date in (start, end))
+
+
+def _key(date):
+    """Returns a date as timestamp of an ISMN record (bytes)."""
+    return pd.Timestamp(date).strftime("%Y/%m/%d %H:%M").encode("ascii")
+
+
+def _seek(file, key, lo, hi):
+    """Returns the offset of the first record at or after offset lo (the
+    start of a line) whose timestamp is not earlier than key, or the end of
+    the file if there is none.
+    """
+    # Invariant: all lines starting before lo are earlier than key, the
+    # first line starting at or after hi isn't (or is the end of file).
+    while hi - lo > _BLOCK:
+        mid = (lo + hi) // 2
+        file.seek(mid)
+        file.readline()
+        pos = file.tell()
+        line = file.readline()
+
+        if not line or line[:_STAMP] >= key:
+            hi = mid + 1
+        else:
+            lo = pos + len(line)
+
+    file.seek(lo)
+    while True:
+        pos = file.tell()
+        line = file.readline()
+        if not line or line[:_STAMP] >= key:
+            return pos
@@ -0,0 +1,176 @@
+import os
+import hashlib
+import importlib.util
+import numpy as np
+import pandas as pd
+from .manifest import _as_list
+
+DATASET_DIR = "./data/results/"
+
+COLUMNS = ["station", "network", "orbit", "t_s1", "VV", "VH", "angle",
+           "t_sm", "sm"]
+
+# The dataset is partitioned by these columns (directories like
+# network=XY/orbit=desc/year=2017/), so reading a network, orbit or date
+# range only touches the matching files.
+PARTITION_COLS = ["network", "orbit", "year"]
+
+
+def to_table(data_dict):
+    """Combines the matched soil moisture and backscatter data of all
+    stations and both orbits (output of postprocess.ts_filter()) into a
+    single long-format table with one row per station, orbit and scene.
+
+    :param data_dict: Dictionary that was modified by ts_filter().
+        :type: Dictionary
+
+    :return: pandas.DataFrame with the columns station, network, orbit
+    ("desc" or "asc"), t_s1, VV, VH, angle, t_sm and sm.
+    """
+    frames = []
+
+    for key, station in data_dict.items():
+        for orbit in ("desc", "asc"):
+            matched = getattr(station, "matched_" + orbit)
+            if matched is None or len(matched) == 0:
+                continue
+
+            angle = matched["angle_" + orbit].values \
+                if "angle_" + orbit in matched.columns \
+                else np.full(len(matched), np.nan)
+
+            frames.append(pd.DataFrame({
+                "station": key,
+                "network": station.network,
+                "orbit": orbit,
+                "t_s1": matched["t_s1_" + orbit].values,
+                "VV": matched["VV_" + orbit].values,
+                "VH": matched["VH_" + orbit].values,
+                "angle": angle,
+                "t_sm": matched["t_sm"].values,
+                "sm": matched["sm"].values}))
+
+    if not frames:
+        table = pd.DataFrame({column: [] for column in COLUMNS})
+        table[["t_s1", "t_sm"]] = table[["t_s1", "t_sm"]] \
+            .astype("datetime64[ns]")
+    else:
+        table = pd.concat(frames, ignore_index=True)
+
+    return table.astype({"station": "category", "network": "category",
+                         "orbit": "category"})
+
+
+def write_dataset(table, path=DATASET_DIR):
+    """Writes a result table (see to_table()) as a Parquet dataset that is
+    partitioned by network, orbit and year of the S-1 acquisition. The
+    rows of each station are written to files of their own, so the
+    stations that are contained in the table replace all of their
+    existing rows, while the rows of all other stations are kept.
+
+    Requires pyarrow.
+
+    :param table: Result table or a dictionary that was modified by
+    postprocess.ts_filter().
+        :type: pandas.DataFrame or Dictionary
+    :param path: (optional) Directory of the dataset.
+        :type: String
+
+    :return: Path of the dataset.
+    """
+    pq = _pyarrow_parquet()
+    import pyarrow as pa
+
+    if isinstance(table, dict):
+        table = to_table(table)
+
+    table = table.assign(year=table["t_s1"].dt.year.astype("int32"))
+    table = table.astype({"station": str, "network": str, "orbit": str})
+
+    for station, rows in table.groupby("station", sort=False):
+        prefix = _file_prefix(station)
+        _remove_files(path, prefix)
+        pq.write_to_dataset(pa.Table.from_pandas(rows, preserve_index=False),
+                            root_path=path, partition_cols=PARTITION_COLS,
+                            basename_template=prefix + "{i}.parquet",
+                            existing_data_behavior="overwrite_or_ignore")
+
+    return path
+
+
+def read_dataset(path=DATASET_DIR, network=None, orbit=None, start=None,
+                 end=None, station=None, columns=None):
+    """Loads (parts of) a result dataset (see write_dataset()). The
+    conditions are pushed down to the Parquet reader: partitions of other
+    networks, orbits and years are skipped and row groups outside of the
+    date range aren't read.
+
+    Requires pyarrow.
+
+    :param path: (optional) Directory of the dataset.
+        :type: String
+    :param network: (optional) Network name or list of network names.
+        :type: String or list of String
+    :param orbit: (optional) "desc" or "asc".
+        :type: String
+    :param start: (optional) First S-1 acquisition time (inclusive).
+        :type: String or datetime
+    :param end: (optional) Last S-1 acquisition time (exclusive).
+        :type: String or datetime
+    :param station: (optional) Station name (dictionary key) or list of
+    names.
+        :type: String or list of String
+    :param columns: (optional) Columns to read. Defaults to all columns
+    of to_table().
+        :type: List of String
+
+    :return: pandas.DataFrame (see to_table())
+    """
+    _pyarrow_parquet()
+
+    filters = []
+    if network is not None:
+        filters.append(("network", "in", _as_list(network)))
+    if orbit is not None:
+        filters.append(("orbit", "==", orbit))
+    if station is not None:
+        filters.append(("station", "in", _as_list(station)))
+    if start is not None:
+        start = pd.Timestamp(start)
+        filters.append(("year", ">=", start.year))
+        filters.append(("t_s1", ">=", start))
+    if end is not None:
+        end = pd.Timestamp(end)
+        filters.append(("year", "<=", end.year))
+        filters.append(("t_s1", "<", end))
+
+    table = pd.read_parquet(path, engine="pyarrow",
+                            columns=list(columns or COLUMNS),
+                            filters=filters or None)
+
+    return table
+
+
+def _pyarrow_parquet():
+    if importlib.util.find_spec("pyarrow") is None:
+        raise ImportError("Writing and reading result datasets requires "
+                          "pyarrow (pip install pyarrow).")
+
+    import pyarrow.parquet as pq
+
+    return pq
+
+
+def _file_prefix(station):
+    """Prefix of the file names of a station in a result dataset."""
+    return hashlib.sha1(station.encode("utf-8")).hexdigest() + "-"
+
+
+def _remove_files(path, prefix):
+    """Removes the files of a station (see _file_prefix()) from all
+    partitions of a result dataset.
+    """
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            if name.startswith(prefix):
+                os.remove(os.path.join(root, name))
@@ -1,5 +1,7 @@
-import ee
 import os
+from .lazy import lazy_import
+
+ee = lazy_import("ee")
 
 
 def setup_pkg():
@@ -7,7 +9,8 @@ def setup_pkg():
 
     setup_dir() is used to check if the subdirectory './data/ISMN/' exists,
     where ISMN files should be stored. It also creates a new subdirectory
-    where ISMN files are copied into during preprocessing.
+    where the header manifest of the ISMN files is stored during
+    preprocessing.
 
     setup_ee() is used to initialize the Google Earth Engine API.
     ee.Initialize() checks if user credentials already exist. If that
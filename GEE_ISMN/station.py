@@ -0,0 +1,46 @@
+class Station(object):
+    """Record of a single ISMN sensor location. It is created by
+    preprocess.data_import() and annotated by each following step of the
+    workflow. The steps set attributes on the record instead of copying it,
+    so the soil moisture data is kept only once in memory.
+
+    Attributes (None until the corresponding step was run):
+        - network, name, sensor (String): ISMN network, station and sensor
+        - latitude, longitude (float): Station coordinates
+        - sm_data (pandas.DataFrame): ISMN soil moisture data
+        - geometry (ee.geometry.Geometry): Point or polygon used for the
+        extraction (earthengine.lc_filter())
+        - box_size (int): Size of the polygon in meters, None for points
+        - landcover (int): CGLS-LC100 landcover class
+        (earthengine.lc_filter())
+        - s1_desc, s1_asc (ee.ImageCollection): Sentinel-1 image
+        collections (earthengine.get_s1_backscatter())
+        - backscatter_desc, backscatter_asc (pandas.DataFrame): Backscatter
+        timeseries, sorted by date, with the system:index of each scene
+        (earthengine.get_s1_backscatter())
+        - matched_desc, matched_asc (pandas.DataFrame): Soil moisture
+        values matched with the backscatter timeseries and incidence angle
+        (postprocess.ts_filter(), see results.to_table() for a combined
+        table of all stations)
+    """
+    __slots__ = ("network", "name", "sensor", "latitude", "longitude",
+                 "sm_data", "geometry", "box_size", "landcover", "s1_desc",
+                 "s1_asc", "backscatter_desc", "backscatter_asc",
+                 "matched_desc", "matched_asc")
+
+    def __init__(self, latitude, longitude, sm_data, network=None,
+                 name=None, sensor=None):
+        for attr in self.__slots__:
+            setattr(self, attr, None)
+
+        self.network = network
+        self.name = name
+        self.sensor = sensor
+        self.latitude = float(latitude)
+        self.longitude = float(longitude)
+        self.sm_data = sm_data
+
+    def __repr__(self):
+        return "Station(%s-%s-%s, %s, %s)" % (self.network, self.name,
+                                              self.sensor, self.latitude,
+                                              self.longitude)
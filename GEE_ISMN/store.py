@@ -0,0 +1,201 @@
+import os
+import hashlib
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from .reader import read_window, window_key
+
+STORE_DIR = "./data/ISMN_Store/"
+
+# Feather needs pyarrow. Without it, the partitions are stored as pickle
+# files, which still avoids parsing the ISMN files again.
+FORMAT = "feather" if importlib.util.find_spec("pyarrow") else "pickle"
+
+_INDEX_COLUMNS = ["path", "window", "size", "mtime_ns", "md5", "partition",
+                  "header"]
+
+
+def read_files(paths, store_dir=STORE_DIR, processes=None, columns=None,
+               start=None, end=None, index=None):
+    """Reads ISMN files (Header + values format) through a columnar on-disk
+    store with one partition per file and time window. Files are only
+    parsed (with ismn.readers.read_data or, for a time window, with
+    reader.read_window) if they are new or if their size, modification
+    time and content hash changed since they were stored. Files that have
+    to be parsed are processed in parallel by a process pool.
+
+    :param paths: Paths of the ISMN files.
+        :type: List of String
+    :param store_dir: (optional) Directory of the store.
+        :type: String
+    :param processes: (optional) Number of worker processes. Defaults to
+    the number of CPUs.
+        :type: int
+    :param columns: (optional) Only these columns are read from the store
+    (feather partitions only read the requested columns from disk).
+        :type: List of String
+    :param start, end: (optional) Only the records within this time window
+    are read (see reader.read_window()).
+        :type: String or datetime
+    :param index: (optional) Index of the store (see _load_index()) when
+    reading files chunk by chunk. It is updated in place, and the caller
+    saves it after the last chunk (see _save_index()). By default, the
+    index is loaded and, if it changed, saved by every call.
+        :type: Dictionary
+
+    :return: List of tuples (header elements, dataframe) in the order of
+    paths.
+    """
+    if not os.path.exists(store_dir):
+        os.makedirs(store_dir, exist_ok=True)
+
+    loaded = index is None
+    if loaded:
+        index = _load_index(store_dir)
+    window = window_key(start, end)
+    changed = False
+    stale = []
+
+    for path in paths:
+        stat = os.stat(path)
+        entry = index.get((path, window))
+
+        if entry is not None and not os.path.exists(
+                os.path.join(store_dir, entry["partition"])):
+            entry = None
+
+        if entry is not None and entry["size"] == stat.st_size \
+                and entry["mtime_ns"] == stat.st_mtime_ns:
+            continue
+
+        changed = True
+        md5 = _md5(path)
+        if entry is not None and entry["md5"] == md5:
+            entry["size"] = stat.st_size
+            entry["mtime_ns"] = stat.st_mtime_ns
+        else:
+            index[(path, window)] = {
+                "path": path, "window": window, "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns, "md5": md5,
+                "partition": _partition_name(path, window), "header": None}
+            stale.append(path)
+
+    if stale:
+        targets = [os.path.join(store_dir, index[(path, window)]["partition"])
+                   for path in stale]
+        windows = [(start, end)] * len(stale)
+
+        if len(stale) == 1 or processes == 1:
+            headers = list(map(_parse_to_store, stale, targets, windows))
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                headers = list(pool.map(_parse_to_store, stale, targets,
+                                        windows,
+                                        chunksize=max(1, len(stale) // 64)))
+
+        for path, header in zip(stale, headers):
+            index[(path, window)]["header"] = header
+
+    if loaded and changed:
+        _save_index(store_dir, index)
+
+    return [(index[(path, window)]["header"].split(),
+             _read_partition(os.path.join(
+                 store_dir, index[(path, window)]["partition"]), columns))
+            for path in paths]
+
+
+def _parse_to_store(path, target, window=(None, None)):
+    """Parses a single ISMN file (or the records within the time window
+    (start, end)) and writes its data to a partition of the store. Runs in
+    a worker process.
+
+    :return: Header line of the file.
+    """
+    if window != (None, None):
+        header_elements, data = read_window(path, *window)
+        _write_partition(data, target)
+
+        return " ".join(header_elements)
+
+    from ismn import readers as ismn
+
+    data = ismn.read_data(path)
+    header_elements, filename_elements = ismn.get_info_from_file(path)
+    _write_partition(data.data, target)
+
+    return " ".join(header_elements)
+
+
+def _write_partition(df, target):
+    tmp_target = target + ".tmp" + str(os.getpid())
+
+    if FORMAT == "feather":
+        df.reset_index().to_feather(tmp_target)
+    else:
+        df.to_pickle(tmp_target)
+
+    os.replace(tmp_target, target)
+
+
+def _read_partition(target, columns=None):
+    if FORMAT == "feather":
+        if columns is not None:
+            import pyarrow.ipc
+            # The first column of a partition is the (reset) index.
+            index_column = pyarrow.ipc.open_file(target).schema.names[0]
+            columns = [index_column] + list(columns)
+
+        df = pd.read_feather(target, columns=columns)
+        df = df.set_index(df.columns[0])
+        if df.index.name == "index":
+            df.index.name = None
+    else:
+        df = pd.read_pickle(target)
+        if columns is not None:
+            df = df[list(columns)]
+
+    return df
+
+
+def _partition_name(path, window=""):
+    name = os.path.abspath(path)
+    if window:
+        name += "|" + window
+    digest = hashlib.sha1(name.encode("utf-8")).hexdigest()
+
+    return digest + "." + FORMAT
+
+
+def _md5(path):
+    md5 = hashlib.md5()
+
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            md5.update(block)
+
+    return md5.hexdigest()
+
+
+def _load_index(store_dir):
+    index_path = os.path.join(store_dir, "index.csv")
+
+    if not os.path.exists(index_path):
+        return {}
+
+    index = pd.read_csv(index_path, dtype={"md5": str, "header": str,
+                                           "window": str})
+    index = index[index["partition"].str.endswith("." + FORMAT)]
+    # The window of whole files ("") is read as NaN.
+    index["window"] = index["window"].fillna("")
+
+    return {(row["path"], row["window"]): row
+            for row in index.to_dict("records")}
+
+
+def _save_index(store_dir, index):
+    index_path = os.path.join(store_dir, "index.csv")
+    tmp_path = index_path + ".tmp" + str(os.getpid())
+    pd.DataFrame(list(index.values()), columns=_INDEX_COLUMNS) \
+        .to_csv(tmp_path, index=False)
+    os.replace(tmp_path, index_path)
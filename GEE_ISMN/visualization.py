@@ -1,9 +1,26 @@
-import ee
-import geehydro # marked as not used, but still important to create the maps!
-import folium
-import webbrowser
-import matplotlib.pyplot as plt
-from pandas.plotting import register_matplotlib_converters
+import os
+import functools
+from concurrent.futures import ProcessPoolExecutor
+from .lazy import lazy_import
+
+ee = lazy_import("ee")
+# geehydro is not used directly, but it adds the GEE methods to folium that
+# are needed to create the maps.
+folium = lazy_import("folium", requires=("geehydro",))
+folium_plugins = lazy_import("folium.plugins", requires=("geehydro",))
+webbrowser = lazy_import("webbrowser")
+plt = lazy_import("matplotlib.pyplot")
+
+# Figure of export_plots(), reused by each (worker) process.
+_figure = None
+
+# Colors of the CGLS-LC100 discrete classification.
+_LC_COLORS = {0: '#282828', 20: '#ffbb22', 30: '#ffff4c', 40: '#f096ff',
+              50: '#fa0000', 60: '#b4b4b4', 70: '#f0f0f0', 80: '#0032c8',
+              90: '#0096a0', 100: '#fae6a0', 111: '#58481f', 112: '#009900',
+              113: '#70663e', 114: '#00cc00', 115: '#4e751f', 116: '#007800',
+              121: '#666000', 122: '#8db400', 123: '#8d7400', 124: '#a0dc00',
+              125: '#929900', 126: '#648c00', 200: '#000080'}
 
 
 def plot_data(data_dict, station_name, orbit=None, pol=None):
@@ -24,13 +41,12 @@ def plot_data(data_dict, station_name, orbit=None, pol=None):
 
     :return: Plot
     """
-    global plot_label, plot_pol, plot_title
     station = station_name
 
-    if data_dict[station][8] is None:
+    if data_dict[station].matched_desc is None:
         raise KeyError("There is no data for the descending orbit of "
                        "station: ", station)
-    elif data_dict[station][9] is None:
+    elif data_dict[station].matched_asc is None:
         raise KeyError("There is no data for the ascending orbit of station: "
                        , station)
     else:
@@ -56,81 +72,202 @@ def plot_data(data_dict, station_name, orbit=None, pol=None):
                             "type \"str\". Valid options are: \"VV\" or "
                             "\"VH\".")
 
-        if orbit == "desc":
-            plot_date = data_dict[station][8].t_s1_desc
-            plot_soil = data_dict[station][8].sm
-            if pol == "VV":
-                plot_pol = data_dict[station][8].VV_desc
-                plot_label = "VV - Descending"
-                plot_title = "ISMN Soil Moisture against Sentinel-1 VV (" \
-                             "Descending Orbit) "
-            elif pol == "VH":
-                plot_pol = data_dict[station][8].VH_desc
-                plot_label = "VH - Descending"
-                plot_title = "ISMN Soil Moisture against Sentinel-1 VH (" \
-                             "Descending Orbit) "
-        elif orbit == "asc":
-            plot_date = data_dict[station][9].t_s1_asc
-            plot_soil = data_dict[station][9].sm
-            if pol == "VV":
-                plot_pol = data_dict[station][9].VV_asc
-                plot_label = "VV - Ascending"
-                plot_title = "ISMN Soil Moisture against Sentinel-1 VV (" \
-                             "Ascending Orbit) "
-            elif pol == "VH":
-                plot_pol = data_dict[station][9].VH_asc
-                plot_label = "VH - Ascending"
-                plot_title = "ISMN Soil Moisture against Sentinel-1 VH (" \
-                             "Ascending Orbit) "
-        else:
+        if orbit not in ("desc", "asc"):
             raise ValueError("Only \"desc\" (= descending) or \"asc\" (= "
                              "ascending) are valid options for the input "
                              "parameter \"orbit\"!")
-        if type(orbit) != str:
-            raise TypeError("The input for the parameter \"orbit\" should be "
-                            "of type \"str\". Valid options are: \"desc\" or "
-                            "\"asc\".")
 
+        from pandas.plotting import register_matplotlib_converters
         register_matplotlib_converters()
-        fig, plot1 = plt.subplots(figsize=(14, 8))
-        plot_s1 = plot1.plot(plot_date, plot_pol, color='red',
-                             label=plot_label)
-
-        plot1.set_xlabel("Year", fontsize=14)
-        plot1.set_ylabel("dB", fontsize=14)
-
-        plot2 = plot1.twinx()
-        plot_sm = plot2.plot(plot_date, plot_soil, color='blue', dashes=[6, 3],
-                             label="Soil Moisture")
-
-        plot2.set_ylabel("Soil Moisture", fontsize=14)
-        plot1.xaxis.set_major_locator(plt.MaxNLocator(10))
-        plot1.tick_params(axis='x', labelrotation=-45)
-        plots = plot_s1 + plot_sm
-        labels = [l.get_label() for l in plots]
-        plot1.legend(plots, labels, bbox_to_anchor=(1.15, 1), loc='upper left',
-                     borderaxespad=0.)
-
-        plt.title(plot_title, fontsize=20)
-        fig.tight_layout()
+        fig = plt.figure(figsize=(14, 8))
+        _draw(fig, getattr(data_dict[station], "matched_" + orbit), orbit,
+              pol)
         plt.show()
 
 
-def show_map(data_dict, station_name):
+def export_plots(data_dict, out_dir="./data/plots/", orbits=("desc", "asc"),
+                 pols=("VV", "VH"), file_format="png", dpi=100,
+                 processes=None):
+    """Saves the plot of plot_data() for every station, orbit and
+    polarisation to a file (e.g. ./data/plots/<station>_desc_VV.png)
+    without displaying it. The plots are drawn on figures that are not
+    managed by pyplot (non-interactive Agg canvas), so no GUI backend is
+    needed. Stations are distributed over a process pool; each worker
+    process reuses a single figure for all of its plots.
+
+    :param data_dict: Dictionary created using the function ts_filter().
+        :type: Dictionary
+    :param out_dir: (optional) Output directory.
+        :type: String
+    :param orbits: (optional) Orbits to plot ("desc" and/or "asc").
+        :type: tuple of String
+    :param pols: (optional) Polarisations to plot ("VV" and/or "VH").
+        :type: tuple of String
+    :param file_format: (optional) File format, e.g. "png", "pdf" or
+    "svg".
+        :type: String
+    :param dpi: (optional) Resolution of raster formats.
+        :type: int
+    :param processes: (optional) Number of worker processes. Defaults to
+    the number of CPUs. 1 draws all plots in the current process.
+        :type: int
+
+    :return: List of paths of the written files.
+    """
+    for orbit in orbits:
+        if orbit not in ("desc", "asc"):
+            raise ValueError("Only \"desc\" (= descending) or \"asc\" (= "
+                             "ascending) are valid options for the input "
+                             "parameter \"orbits\"!")
+    for pol in pols:
+        if pol not in ("VV", "VH"):
+            raise ValueError("Only \"VV\" or \"VH\" are valid options for "
+                             "the input parameter \"pols\"!")
+
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir, exist_ok=True)
+
+    # Only the matched dataframes are sent to the worker processes.
+    jobs = []
+    for key, station in data_dict.items():
+        matched = {orbit: getattr(station, "matched_" + orbit)
+                   for orbit in orbits
+                   if getattr(station, "matched_" + orbit) is not None}
+        if matched:
+            jobs.append((key, matched))
+
+    export = functools.partial(_export_station, out_dir=out_dir, pols=pols,
+                               file_format=file_format, dpi=dpi)
+
+    if processes == 1 or len(jobs) < 2:
+        paths = [export(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            paths = list(pool.map(export, jobs,
+                                  chunksize=max(1, len(jobs) // 64)))
+
+    return [path for station_paths in paths for path in station_paths]
+
+
+def _export_station(job, out_dir, pols, file_format, dpi):
+    """Saves all plots of a single station (see export_plots()).
+
+    :return: List of paths of the written files.
+    """
+    key, matched = job
+    fig = _worker_figure()
+    paths = []
+
+    for orbit, df in matched.items():
+        for pol in pols:
+            path = os.path.join(out_dir, "%s_%s_%s.%s"
+                                % (key, orbit, pol, file_format))
+            fig.clf()
+            _draw(fig, df, orbit, pol)
+            fig.savefig(path, format=file_format, dpi=dpi)
+            paths.append(path)
+
+    return paths
+
+
+def _worker_figure():
+    """Returns the figure of the current process, which is reused for all
+    plots of export_plots(). The figure isn't managed by pyplot.
+    """
+    global _figure
+
+    if _figure is None:
+        from matplotlib.figure import Figure
+        from pandas.plotting import register_matplotlib_converters
+        register_matplotlib_converters()
+        _figure = Figure(figsize=(14, 8))
+
+    return _figure
+
+
+def _draw(fig, matched, orbit, pol):
+    """Draws the soil moisture and backscatter timeseries of one orbit and
+    polarisation (output of ts_filter()) on a figure.
+    """
+    from matplotlib.ticker import MaxNLocator
+
+    orbit_name = {"desc": "Descending", "asc": "Ascending"}[orbit]
+    plot_label = pol + " - " + orbit_name
+    plot_title = "ISMN Soil Moisture against Sentinel-1 " + pol + " (" \
+                 + orbit_name + " Orbit) "
+
+    plot1 = fig.add_subplot(111)
+    plot_s1 = plot1.plot(matched["t_s1_" + orbit], matched[pol + "_" + orbit],
+                         color='red', label=plot_label)
+
+    plot1.set_xlabel("Year", fontsize=14)
+    plot1.set_ylabel("dB", fontsize=14)
+
+    plot2 = plot1.twinx()
+    plot_sm = plot2.plot(matched["t_s1_" + orbit], matched["sm"],
+                         color='blue', dashes=[6, 3], label="Soil Moisture")
+
+    plot2.set_ylabel("Soil Moisture", fontsize=14)
+    plot1.xaxis.set_major_locator(MaxNLocator(10))
+    plot1.tick_params(axis='x', labelrotation=-45)
+    plots = plot_s1 + plot_sm
+    labels = [l.get_label() for l in plots]
+    plot1.legend(plots, labels, bbox_to_anchor=(1.15, 1), loc='upper left',
+                 borderaxespad=0.)
+
+    plot1.set_title(plot_title, fontsize=20)
+    fig.tight_layout()
+
+
+def show_map(data_dict, station_name=None, cluster=False, color_by=None,
+             out_file=None, open_browser=None):
     """Display a map (Google Maps/Satellite imagery) with the location of an
     ISMN station (or surrounding polygon, depending on previous user input).
 
+    If station_name is None or a list of station names, a single map of
+    all (or the listed) stations is created instead (see _network_map()):
+    all geometries are added as one FeatureCollection layer and each
+    station gets a marker.
+
     :param data_dict: Dictionary that contains data of ISMN stations to be
     analysed. Should at least contain latitude, longitude and the converted
     GEE geometry object.
     :type data_dict: Dictionary
-    :param station_name: Name of the ISMN station that should be visualized
-    on a map.
-    :type station_name: String
-
-    :return: Saves map.html in the current working directory folder and
-    opens the file in the standard webbrowser.
+    :param station_name: (optional) Name of the ISMN station that should be
+    visualized on a map, or list of names. Defaults to all stations.
+    :type station_name: String or list of String
+    :param cluster: (optional) Cluster the markers of nearby stations
+    (multi-station map only).
+    :type cluster: bool
+    :param color_by: (optional) Marker color: "landcover" (CGLS-LC100
+    colors) or "matches" (number of matched S-1 scenes, red = few, green =
+    many). Defaults to blue markers (multi-station map only).
+    :type color_by: String
+    :param out_file: (optional) Path of the HTML file. Defaults to
+    'map.html'.
+    :type out_file: String
+    :param open_browser: (optional) Open the file in the standard
+    webbrowser. Defaults to True for a single station and False for
+    multi-station maps.
+    :type open_browser: bool
+
+    :return: Saves the map in the current working directory folder (and
+    opens the file in the standard webbrowser). Returns the path of the
+    file for multi-station maps.
     """
+    if out_file is None:
+        out_file = 'map.html'
+
+    if station_name is None or isinstance(station_name, (list, tuple)):
+        keys = list(data_dict.keys()) if station_name is None \
+            else list(station_name)
+        _network_map(data_dict, keys, cluster, color_by).save(out_file)
+
+        if open_browser:
+            webbrowser.open(out_file)
+
+        return out_file
+
     station = station_name
 
     if type(station) != str:
@@ -142,17 +279,97 @@ def show_map(data_dict, station_name):
         print("The station " + str(station) + " was not found in the input "
                                               "dictionary.")
 
-    lat = data_dict[station][0]
-    long = data_dict[station][1]
-    geo = data_dict[station][3]
+    lat = data_dict[station].latitude
+    long = data_dict[station].longitude
+    geo = data_dict[station].geometry
 
     map_ = folium.Map(location=[lat, long], zoom_start=20)
     map_.setOptions('SATELLITE')
     map_.addLayer(geo, {'color': 'FF0000'})
     map_.setControlVisibility(layerControl=True)
 
-    map_.save('map.html')
-    return webbrowser.open('map.html')
+    map_.save(out_file)
+    if open_browser is False:
+        return out_file
+
+    return webbrowser.open(out_file)
+
+
+def _network_map(data_dict, keys, cluster=False, color_by=None):
+    """Creates a single map of several stations. The (unique) geometries
+    of all stations are added as one FeatureCollection layer, which needs
+    a single tile request to Earth Engine. Each station also gets a
+    marker with a popup (name, land cover class and number of matched
+    scenes).
+
+    For parameter description see: show_map()
+
+    :return: folium.Map
+    """
+    if color_by not in (None, "landcover", "matches"):
+        raise ValueError("Only \"landcover\" or \"matches\" are valid "
+                         "options for the input parameter \"color_by\"!")
+
+    stations = [(key, data_dict[key]) for key in keys]
+    if not stations:
+        raise ValueError("There are no stations to show on the map.")
+
+    lats = [station.latitude for key, station in stations]
+    longs = [station.longitude for key, station in stations]
+
+    map_ = folium.Map(location=[sum(lats) / len(lats),
+                                sum(longs) / len(longs)])
+    map_.setOptions('SATELLITE')
+
+    geometries = {}
+    for key, station in stations:
+        if station.geometry is not None:
+            geometries.setdefault(id(station.geometry), station.geometry)
+    if geometries:
+        fc = ee.FeatureCollection([ee.Feature(geo)
+                                   for geo in geometries.values()])
+        map_.addLayer(fc, {'color': 'FF0000'}, 'Stations')
+
+    matches = {key: _match_count(station) for key, station in stations}
+    max_matches = max(max(matches.values()), 1)
+
+    if cluster:
+        layer = folium_plugins.MarkerCluster(name='Markers').add_to(map_)
+    else:
+        layer = folium.FeatureGroup(name='Markers').add_to(map_)
+
+    for key, station in stations:
+        if color_by == "landcover":
+            color = _LC_COLORS.get(station.landcover, '#3388ff')
+        elif color_by == "matches":
+            color = _ramp(matches[key] / float(max_matches))
+        else:
+            color = '#3388ff'
+
+        popup = "%s<br>Land cover: %s<br>Matched scenes: %d" \
+                % (key, station.landcover, matches[key])
+        folium.CircleMarker(location=[station.latitude, station.longitude],
+                            radius=6, color=color, fill=True,
+                            fill_color=color, fill_opacity=0.8,
+                            popup=popup).add_to(layer)
+
+    map_.fit_bounds([[min(lats), min(longs)], [max(lats), max(longs)]])
+    map_.setControlVisibility(layerControl=True)
+
+    return map_
+
+
+def _match_count(station):
+    """Number of matched S-1 scenes of a station (both orbits)."""
+    return sum(len(df) for df in (station.matched_desc, station.matched_asc)
+               if df is not None)
+
+
+def _ramp(value):
+    """Color between red (0) and green (1) as hex string."""
+    value = min(max(value, 0.), 1.)
+
+    return '#%02x%02x00' % (int(255 * (1 - value)), int(200 * value))
 
 
 def show_s1(data_dict, station_name, date, orbit=None, pol=None):
@@ -200,28 +417,31 @@ def show_s1(data_dict, station_name, date, orbit=None, pol=None):
         raise TypeError("The input for the parameter \"pol\" should be of "
                         "type \"str\". Valid options are: \"VV\" or \"VH\".")
 
-    date = ee.Date(date)
-    lat = data_dict[station][0]
-    long = data_dict[station][1]
-    geo = data_dict[station][3]
-
-    img_coll_desc = data_dict[station][4].select([pol])
-    img_coll_asc = data_dict[station][5].select([pol])
-
-    if orbit == "desc":
-        img_coll = _date_dist(img_coll_desc, date)
-    elif orbit == "asc":
-        img_coll = _date_dist(img_coll_asc, date)
-    else:
-        raise ValueError("Only \"desc\" (= descending) or \"asc\" (= "
-                         "ascending) are valid options for the input "
-                         "parameter \"orbit\"!")
     if type(orbit) != str:
         raise TypeError("The input for the parameter \"orbit\" should be of "
                         "type \"str\". Valid options are: \"desc\" or "
                         "\"asc\".")
+    elif orbit not in ("desc", "asc"):
+        raise ValueError("Only \"desc\" (= descending) or \"asc\" (= "
+                         "ascending) are valid options for the input "
+                         "parameter \"orbit\"!")
+
+    lat = data_dict[station].latitude
+    long = data_dict[station].longitude
+    geo = data_dict[station].geometry
 
-    img = img_coll.sort('dateDist', True).first()
+    # The scene IDs of the extracted backscatter timeseries are searched
+    # locally. Only without them (e.g. before get_s1_backscatter() was
+    # run), the closest scene is searched in the image collection.
+    scene_id = _nearest_scene(
+        getattr(data_dict[station], "backscatter_" + orbit), date)
+
+    if scene_id is not None:
+        img = ee.Image("COPERNICUS/S1_GRD/" + scene_id).select([pol])
+    else:
+        img_coll = getattr(data_dict[station], "s1_" + orbit).select([pol])
+        img = _date_dist(img_coll, ee.Date(date)) \
+            .sort('dateDist', True).first()
 
     _map = folium.Map(location=[lat, long], zoom_start=15)
     _map.setOptions('SATELLITE')
@@ -234,6 +454,34 @@ def show_s1(data_dict, station_name, date, orbit=None, pol=None):
     return img
 
 
+def _nearest_scene(backscatter, date):
+    """Finds the scene closest in time to date by binary search in a
+    backscatter timeseries (sorted by date, see
+    earthengine.get_s1_backscatter()).
+
+    :return: system:index of the scene or None if the timeseries is
+    missing, empty or has no scene IDs.
+    """
+    if backscatter is None or len(backscatter) == 0 \
+            or "id" not in backscatter.columns:
+        return None
+
+    import pandas as pd
+
+    times = backscatter.index
+    if not times.is_monotonic_increasing:
+        backscatter = backscatter.sort_index(kind="mergesort")
+        times = backscatter.index
+
+    date = pd.Timestamp(date)
+    pos = times.searchsorted(date)
+    candidates = [i for i in (pos - 1, pos) if 0 <= i < len(times)]
+    nearest = min(candidates, key=lambda i: abs(times[i] - date))
+    scene_id = backscatter["id"].iloc[nearest]
+
+    return None if pd.isna(scene_id) else scene_id
+
+
 def _date_dist(img_coll, date):
     """Adds 'dateDist' column to each image of an image collection.
     dateDist = deviation of 'system:time_start' from a given date (in
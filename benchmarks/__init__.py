@@ -0,0 +1 @@
+"""End-to-end benchmarks of the GEE_ISMN workflow. See benchmarks/run.py."""
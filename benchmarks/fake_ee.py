@@ -0,0 +1,729 @@
+"""In-process stand-in for the Earth Engine Python API (module 'ee').
+
+It implements the part of the API that GEE_ISMN uses, evaluates everything
+locally and answers getInfo() with realistic payload shapes and sizes:
+Sentinel-1 scenes are generated on a grid of 2 degree tiles with a fixed
+revisit time per orbit, and the CGLS-LC100 image returns a land cover
+class per location. Every getInfo() is a simulated request with
+injectable latency, concurrency and rate limits (which raise the same
+errors as the real service) and element limits.
+
+Usage (before GEE_ISMN.earthengine is imported):
+
+    from benchmarks import fake_ee
+    ee = fake_ee.install(latency=0.2, max_concurrent=10)
+    ...
+    ee.backend.stats
+"""
+import sys
+import json
+import math
+import time
+import types
+import datetime
+import threading
+from collections import deque
+
+S1_START = datetime.datetime(2014, 10, 3)
+TILE_SIZE = 2.0  # degrees
+LC_CLASSES = (40, 40, 40, 60, 30, 20, 50, 111, 126, 90)
+
+_backend = None
+
+
+class EEException(Exception):
+    pass
+
+
+class Backend(object):
+    """Simulated server. Every getInfo() passes request(), which applies
+    the latency, enforces the limits and keeps statistics.
+
+    :param latency: Base latency of a request (seconds).
+    :param latency_per_element: Additional latency per returned element.
+    :param max_concurrent: Maximum number of concurrent requests; more
+    requests fail with "Too many concurrent aggregations".
+    :param max_qps: Maximum number of requests per second; more requests
+    fail with "429 Too Many Requests".
+    :param element_limit: Maximum number of elements of a collection that
+    is fetched with getInfo().
+    :param revisit_days: Days between two scenes of the same tile & orbit.
+    :param end: Date of the last generated scene.
+    :param masked: Fraction of S-1 pixels without a valid value (e.g.
+    masked borders), for which reducers return None.
+    """
+
+    def __init__(self, latency=0.0, latency_per_element=0.0,
+                 max_concurrent=None, max_qps=None, element_limit=5000,
+                 revisit_days=6, end=datetime.datetime(2024, 12, 31),
+                 masked=0.0):
+        self.latency = latency
+        self.latency_per_element = latency_per_element
+        self.max_concurrent = max_concurrent
+        self.max_qps = max_qps
+        self.element_limit = element_limit
+        self.revisit_days = revisit_days
+        self.end = end
+        self.masked = masked
+        self.stats = {"requests": 0, "throttled": 0, "elements": 0,
+                      "bytes": 0}
+        self._active = 0
+        self._recent = deque()
+        self._failures = deque()
+        self._lock = threading.Lock()
+
+    def reset_stats(self):
+        with self._lock:
+            for key in self.stats:
+                self.stats[key] = 0
+
+    def fail(self, message, count=1):
+        """Lets the next count requests fail with EEException(message),
+        e.g. "503 Service Unavailable".
+        """
+        with self._lock:
+            self._failures.extend([message] * count)
+
+    def request(self, compute):
+        with self._lock:
+            if self._failures:
+                raise EEException(self._failures.popleft())
+
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > 1:
+                self._recent.popleft()
+
+            if self.max_concurrent is not None \
+                    and self._active >= self.max_concurrent:
+                self.stats["throttled"] += 1
+                raise EEException("Too many concurrent aggregations.")
+            if self.max_qps is not None and len(self._recent) >= self.max_qps:
+                self.stats["throttled"] += 1
+                raise EEException("429 Too Many Requests: Request rate or "
+                                  "concurrency limit exceeded.")
+
+            self._recent.append(now)
+            self._active += 1
+
+        try:
+            value = compute()
+            elements = len(value) if isinstance(value, list) else 1
+            payload = json.dumps(value, default=str)
+            time.sleep(self.latency + elements * self.latency_per_element)
+
+            with self._lock:
+                self.stats["requests"] += 1
+                self.stats["elements"] += elements
+                self.stats["bytes"] += len(payload)
+
+            return json.loads(payload)
+        finally:
+            with self._lock:
+                self._active -= 1
+
+
+def install(**kwargs):
+    """Creates a fake 'ee' module with a new Backend (see Backend for the
+    keyword arguments) and registers it in sys.modules.
+
+    :return: The fake module. Its attribute 'backend' is the Backend.
+    """
+    global _backend
+    _backend = Backend(**kwargs)
+
+    module = types.ModuleType("ee")
+    module.__file__ = __file__
+    module.backend = _backend
+    module.EEException = EEException
+    module.Initialize = lambda *args, **kwargs: None
+    module.Authenticate = lambda *args, **kwargs: None
+    module.Geometry = Geometry
+    module.geometry = types.SimpleNamespace(Geometry=Geometry)
+    module.Image = Image
+    module.ImageCollection = ImageCollection
+    module.Feature = Feature
+    module.FeatureCollection = FeatureCollection
+    module.Filter = Filter
+    module.Reducer = Reducer
+    module.Date = Date
+    module.Number = Number
+    module.List = List
+    module.Dictionary = Dictionary
+
+    sys.modules["ee"] = module
+
+    return module
+
+
+def _resolve(value):
+    """Returns the local value of a (possibly lazy) fake object."""
+    while isinstance(value, Value):
+        value = value.compute()
+
+    if isinstance(value, list):
+        return [_resolve(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _resolve(v) for k, v in value.items()}
+
+    return value
+
+
+def _to_millis(date):
+    date = _resolve(date)
+
+    if isinstance(date, Date):
+        return date.value
+    if isinstance(date, (int, float)):
+        return int(date)
+    if isinstance(date, str):
+        date = datetime.datetime.fromisoformat(date)
+
+    return int((date - datetime.datetime(1970, 1, 1)).total_seconds() * 1000)
+
+
+def _noise(*args):
+    x = sum((i + 1) * 12.9898 * a for i, a in enumerate(args))
+
+    return math.sin(x) * 43758.5453 % 1
+
+
+class Value(object):
+    """Lazy server-side value."""
+
+    def __init__(self, compute):
+        self.compute = compute
+
+    def getInfo(self):
+        return _backend.request(lambda: _resolve(self))
+
+    def get(self, name):
+        return Value(lambda: _resolve(self).get(name))
+
+
+class Number(Value):
+    def __init__(self, value):
+        super(Number, self).__init__(lambda: _resolve(value))
+
+    def subtract(self, other):
+        return Number(Value(lambda: _resolve(self) - _resolve(other)))
+
+    def abs(self):
+        return Number(Value(lambda: abs(_resolve(self))))
+
+
+class List(Value):
+    def __init__(self, values):
+        super(List, self).__init__(lambda: list(_resolve(values)))
+
+
+class Dictionary(Value):
+    def __init__(self, values):
+        super(Dictionary, self).__init__(lambda: dict(_resolve(values)))
+
+
+class Date(object):
+    def __init__(self, date):
+        self.value = _to_millis(date)
+
+    def millis(self):
+        return Number(self.value)
+
+
+class Geometry(object):
+    """Point or rectangle (bounding box in degrees)."""
+
+    def __init__(self, kind, bbox, definition):
+        self.kind = kind
+        self.bbox = bbox
+        self.definition = definition
+
+    @staticmethod
+    def Point(x, y):
+        return Geometry("Point", (x, y, x, y), ["Point", x, y])
+
+    def buffer(self, distance):
+        dy = distance / 111320.
+        dx = dy / max(math.cos(math.radians(self.bbox[1])), 1e-6)
+        x0, y0, x1, y1 = self.bbox
+
+        return Geometry("Polygon", (x0 - dx, y0 - dy, x1 + dx, y1 + dy),
+                        self.definition + ["buffer", distance])
+
+    def bounds(self):
+        return Geometry("Polygon", self.bbox, self.definition + ["bounds"])
+
+    def centroid(self):
+        x0, y0, x1, y1 = self.bbox
+
+        return (x0 + x1) / 2., (y0 + y1) / 2.
+
+    def intersects(self, bbox):
+        return not (self.bbox[2] < bbox[0] or self.bbox[0] > bbox[2]
+                    or self.bbox[3] < bbox[1] or self.bbox[1] > bbox[3])
+
+    def type(self):
+        return Value(lambda: self.kind)
+
+    def serialize(self):
+        return json.dumps(self.definition)
+
+    def info(self):
+        if self.kind == "Point":
+            return {"type": "Point", "coordinates": list(self.bbox[:2])}
+
+        x0, y0, x1, y1 = self.bbox
+
+        return {"type": "Polygon", "coordinates": [[[x0, y0], [x1, y0],
+                                                    [x1, y1], [x0, y1],
+                                                    [x0, y0]]]}
+
+    def getInfo(self):
+        return _backend.request(self.info)
+
+
+def _bboxes(geometry):
+    if isinstance(geometry, Geometry):
+        return [geometry.bbox]
+
+    return [f.geometry_.bbox for f in geometry.items()
+            if f.geometry_ is not None]
+
+
+class Reducer(object):
+    def __init__(self, kind, outputs=None, count=1):
+        self.kind = kind
+        self.outputs = outputs
+        self.count = count
+
+    @staticmethod
+    def first():
+        return Reducer("first")
+
+    @staticmethod
+    def mean():
+        return Reducer("mean")
+
+    @staticmethod
+    def toList():
+        return Reducer("list")
+
+    def repeat(self, count):
+        return Reducer(self.kind, self.outputs, count)
+
+    def setOutputs(self, outputs):
+        return Reducer(self.kind, outputs)
+
+    def output_names(self, bands, single_band_name=True):
+        # Like Earth Engine: reduceRegion() names the output of a single
+        # band image after the band, reduceRegions() after the reducer.
+        if self.outputs:
+            return self.outputs
+        if len(bands) == 1 and not single_band_name:
+            return [self.kind]
+
+        return bands
+
+
+class Filter(object):
+    def __init__(self, test):
+        self.test = test
+
+    @staticmethod
+    def eq(name, value):
+        return Filter(lambda p: p.get(name) == _resolve(value))
+
+    @staticmethod
+    def lt(name, value):
+        return Filter(lambda p: p.get(name) is not None
+                      and p.get(name) < _resolve(value))
+
+    @staticmethod
+    def lte(name, value):
+        return Filter(lambda p: p.get(name) is not None
+                      and p.get(name) <= _resolve(value))
+
+    @staticmethod
+    def gt(name, value):
+        return Filter(lambda p: p.get(name) is not None
+                      and p.get(name) > _resolve(value))
+
+    @staticmethod
+    def gte(name, value):
+        return Filter(lambda p: p.get(name) is not None
+                      and p.get(name) >= _resolve(value))
+
+    @staticmethod
+    def listContains(name, value):
+        return Filter(lambda p: value in (p.get(name) or []))
+
+    @staticmethod
+    def notNull(names):
+        return Filter(lambda p: all(p.get(n) is not None for n in names))
+
+    @staticmethod
+    def And(*filters):
+        return Filter(lambda p: all(f.test(p) for f in filters))
+
+    @staticmethod
+    def Or(*filters):
+        return Filter(lambda p: any(f.test(p) for f in filters))
+
+
+class Image(object):
+    """Image with named bands. Band values are computed by
+    value_fn(band, lon, lat)."""
+
+    def __init__(self, props, bands, footprint, value_fn):
+        self.props = props
+        self.bands = bands
+        self.footprint = footprint
+        self.value_fn = value_fn
+
+    def select(self, bands):
+        bands = [bands] if isinstance(bands, str) else list(bands)
+
+        return Image(self.props, bands, self.footprint, self.value_fn)
+
+    def get(self, name):
+        return self.props.get(name)
+
+    def set(self, *args):
+        props = dict(self.props)
+        props.update(args[0] if len(args) == 1 else {args[0]: args[1]})
+
+        return Image(_resolve(props), self.bands, self.footprint,
+                     self.value_fn)
+
+    def geometry(self):
+        return self.footprint
+
+    def _reduce(self, reducer, geometry, single_band_name=True):
+        lon, lat = geometry.centroid()
+        names = reducer.output_names(self.bands, single_band_name)
+
+        return {name: self.value_fn(band, lon, lat)
+                for name, band in zip(names, self.bands)}
+
+    def reduceRegion(self, reducer, geometry, scale=None, **kwargs):
+        return Dictionary(Value(lambda: self._reduce(reducer, geometry)))
+
+    def reduceRegions(self, collection, reducer, scale=None, **kwargs):
+        def _items():
+            out = []
+            for f in collection.items():
+                values = self._reduce(reducer, f.geometry_, False)
+                out.append(f.set({k: v for k, v in values.items()
+                                  if v is not None}))
+
+            return out
+
+        return FeatureCollection(_items)
+
+
+class Feature(object):
+    def __init__(self, geometry, properties=None, id=None):
+        self.geometry_ = geometry
+        self.props = dict(_resolve(properties) or {})
+        self.id = id
+
+    def get(self, name):
+        return self.props.get(name)
+
+    def set(self, *args):
+        props = dict(self.props)
+        props.update(args[0] if len(args) == 1 else {args[0]: args[1]})
+
+        return Feature(self.geometry_, props, self.id)
+
+    def info(self):
+        return {"type": "Feature",
+                "geometry": None if self.geometry_ is None
+                else self.geometry_.info(),
+                "id": self.id,
+                "properties": self.props}
+
+
+class _Collection(object):
+    """Lazy collection: a source (list, function or _S1Source) and a chain
+    of operations that are applied when the items are needed."""
+
+    def __init__(self, items, ops=(), bounds=None):
+        self._source = items
+        self._ops = tuple(ops)
+        self._bounds = bounds
+
+    def items(self):
+        if isinstance(self._source, _S1Source):
+            items = self._source(self._bounds)
+        elif callable(self._source):
+            items = self._source()
+        else:
+            items = list(self._source)
+
+        for op in self._ops:
+            items = op(items)
+
+        return items
+
+    def _with(self, op, bounds=None):
+        return self.__class__(self._source, self._ops + (op,),
+                              bounds if bounds is not None else self._bounds)
+
+    def filter(self, flt):
+        return self._with(lambda items: [x for x in items
+                                         if flt.test(x.props)])
+
+    def filterBounds(self, geometry):
+        def _op(items):
+            bboxes = _bboxes(geometry)
+
+            return [x for x in items
+                    if any(_geometry_of(x).intersects(b) for b in bboxes)]
+
+        return self._with(_op, bounds=geometry if self._bounds is None
+                          else None)
+
+    def filterDate(self, start, end=None):
+        # Like Earth Engine: without an end date, the range is a single
+        # millisecond.
+        start = _to_millis(start)
+        end = start + 1 if end is None else _to_millis(end)
+
+        return self._with(lambda items: [
+            x for x in items
+            if start <= x.props["system:time_start"] < end])
+
+    def map(self, fn):
+        def _items():
+            out = []
+            for x in self.items():
+                y = fn(x)
+                if isinstance(y, Feature) and y.id is None:
+                    y.id = x.props.get("system:index", x.id
+                                       if isinstance(x, Feature) else None)
+                out.append(y)
+
+            return out
+
+        if isinstance(self, ImageCollection):
+            return _MappedCollection(_items)
+
+        return self.__class__(_items)
+
+    def sort(self, prop, ascending=True):
+        return self._with(lambda items: sorted(
+            items, key=lambda x: x.props.get(prop), reverse=not ascending))
+
+    def merge(self, other):
+        return self.__class__(lambda: self.items() + other.items())
+
+    def first(self):
+        items = self.items()
+
+        return items[0] if items else None
+
+    def size(self):
+        return Number(Value(lambda: len(self.items())))
+
+    def aggregate_min(self, prop):
+        return Number(Value(lambda: min(
+            (x.props[prop] for x in self.items()), default=None)))
+
+    def aggregate_max(self, prop):
+        return Number(Value(lambda: max(
+            (x.props[prop] for x in self.items()), default=None)))
+
+    def reduceColumns(self, reducer, selectors):
+        # Only ee.Reducer.toList().repeat(n): one list per selector.
+        def _compute():
+            items = self.items()
+
+            if len(items) > _backend.element_limit:
+                raise EEException("User memory limit exceeded.")
+
+            return {"list": [[x.props.get(s) for x in items]
+                             for s in selectors]}
+
+        return Dictionary(Value(_compute))
+
+    def toList(self, count, offset=0):
+        return List(Value(lambda: [_info(x) for x in
+                                   self.items()[offset:offset + count]]))
+
+    def getInfo(self):
+        def _compute():
+            items = self.items()
+
+            if len(items) > _backend.element_limit:
+                raise EEException("Collection query aborted after "
+                                  "accumulating over %d elements."
+                                  % _backend.element_limit)
+
+            return [_info(x) for x in items]
+
+        features = _backend.request(_compute)
+
+        return {"type": "FeatureCollection", "features": features}
+
+
+class FeatureCollection(_Collection):
+    def __init__(self, items, ops=(), bounds=None):
+        if isinstance(items, Feature):
+            items = [items]
+        super(FeatureCollection, self).__init__(items, ops, bounds)
+
+    def select(self, propertySelectors, newProperties=None,
+               retainGeometry=True):
+        return self._with(lambda items: [
+            Feature(f.geometry_ if retainGeometry else None,
+                    {k: v for k, v in f.props.items()
+                     if k in propertySelectors}, f.id)
+            for f in items])
+
+
+class _MappedCollection(FeatureCollection):
+    """Result of ImageCollection.map(): a collection of features, images or
+    feature collections."""
+
+    def flatten(self):
+        return FeatureCollection(lambda: [f for fc in self.items()
+                                          for f in fc.items()])
+
+
+class ImageCollection(_Collection):
+    """Collection of images. The constructor accepts the asset IDs of the
+    Sentinel-1 GRD and the CGLS-LC100 collection. S-1 scenes are only
+    generated for the tiles of the first filterBounds() geometry."""
+
+    def __init__(self, items, ops=(), bounds=None):
+        if isinstance(items, str):
+            asset = items
+            if asset == "COPERNICUS/S1_GRD":
+                items = _S1Source()
+            elif asset == "COPERNICUS/Landcover/100m/Proba-V/Global":
+                items = [_landcover_image()]
+            else:
+                raise EEException("ImageCollection.load: ImageCollection "
+                                  "asset '%s' not found." % asset)
+
+        super(ImageCollection, self).__init__(items, ops, bounds)
+
+    def getRegion(self, geometry, scale=None):
+        def _compute():
+            rows = [["id", "longitude", "latitude", "time"]]
+            lon, lat = geometry.centroid()
+
+            for image in self.items():
+                if len(rows) == 1:
+                    rows[0] = rows[0] + image.bands
+                rows.append([image.props["system:index"], lon, lat,
+                             image.props["system:time_start"]]
+                            + [image.value_fn(b, lon, lat)
+                               for b in image.bands])
+
+            if len(rows) * len(rows[0]) > 1048576:
+                raise EEException("ImageCollection.getRegion: Too many "
+                                  "values: %d points x %d bands x %d "
+                                  "images > 1048576."
+                                  % (1, len(rows[0]) - 4, len(rows) - 1))
+
+            return rows
+
+        return List(Value(_compute))
+
+    def select(self, bands):
+        return self._with(lambda items: [i.select(bands) for i in items])
+
+
+class _S1Source(object):
+    """Generates Sentinel-1 scenes (both orbits) for all tiles that
+    intersect the bounds."""
+
+    def __call__(self, bounds):
+        if bounds is None:
+            raise EEException("Computation timed out.")
+
+        tiles = set()
+        for x0, y0, x1, y1 in _bboxes(bounds):
+            for tx in range(int(math.floor(x0 / TILE_SIZE)),
+                            int(math.floor(x1 / TILE_SIZE)) + 1):
+                for ty in range(int(math.floor(y0 / TILE_SIZE)),
+                                int(math.floor(y1 / TILE_SIZE)) + 1):
+                    tiles.add((tx, ty))
+
+        images = []
+        for tile in sorted(tiles):
+            for orbit, hour in (("DESCENDING", 5.5), ("ASCENDING", 17.5)):
+                images.extend(_s1_scenes(tile, orbit, hour))
+
+        return images
+
+
+def _s1_scenes(tile, orbit, hour):
+    tx, ty = tile
+    revisit = _backend.revisit_days
+    offset = (tx * 7 + ty * 3 + (orbit == "ASCENDING")) % revisit
+    date = S1_START + datetime.timedelta(days=offset, hours=hour,
+                                         seconds=(tx * 13 + ty * 17) % 60)
+    footprint = Geometry("Polygon", (tx * TILE_SIZE, ty * TILE_SIZE,
+                                     (tx + 1) * TILE_SIZE,
+                                     (ty + 1) * TILE_SIZE), ["tile", tx, ty])
+    step = datetime.timedelta(days=revisit)
+    images = []
+
+    while date <= _backend.end:
+        stamp = date.strftime("%Y%m%dT%H%M%S")
+        millis = _to_millis(date)
+        props = {"system:index": "S1%s_IW_GRDH_1SDV_%s_%s_0%d%d_FAKE_%04d"
+                                 % ("AB"[len(images) % 2], stamp, stamp,
+                                    tx % 10, ty % 10,
+                                    (tx * 31 + ty) % 10000),
+                 "system:time_start": millis,
+                 "orbitProperties_pass": orbit,
+                 "instrumentMode": "IW",
+                 "transmitterReceiverPolarisation": ["VV", "VH"]}
+        images.append(Image(props, ["VV", "VH", "angle"], footprint,
+                            _s1_value_fn(millis)))
+        date += step
+
+    return images
+
+
+def _s1_value_fn(millis):
+    day = millis / 86400000.
+
+    def _value(band, lon, lat):
+        if _noise(lat, lon, day) < _backend.masked:
+            return None
+        n = _noise(lon, lat, day)
+        if band == "VV":
+            return -11 + 3 * math.sin(day / 58.) + 2 * n
+        if band == "VH":
+            return -18 + 3 * math.sin(day / 58.) + 2 * n
+        if band == "angle":
+            return 30 + 15 * _noise(lon, lat)
+        return None
+
+    return _value
+
+
+def _landcover_image():
+    def _value(band, lon, lat):
+        return LC_CLASSES[int(_noise(round(lon, 3), round(lat, 3)) *
+                              len(LC_CLASSES))]
+
+    return Image({"system:index": "2019"}, ["discrete_classification"],
+                 Geometry("Polygon", (-180, -90, 180, 90), ["global"]),
+                 _value)
+
+
+def _geometry_of(x):
+    return x.footprint if isinstance(x, Image) else x.geometry_
+
+
+def _info(x):
+    if isinstance(x, Feature):
+        return x.info()
+
+    return {"type": "Image", "id": x.props.get("system:index"),
+            "bands": [{"id": b} for b in x.bands], "properties": x.props}
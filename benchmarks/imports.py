@@ -0,0 +1,72 @@
+"""Measures the import time of each GEE_ISMN module in a fresh interpreter
+and checks that no heavy backend is loaded at import time.
+
+    python -m benchmarks.imports --budget 1.0
+
+The exit code is 1 if a module exceeds the budget (seconds) or loads one of
+the backends in HEAVY.
+"""
+import sys
+import json
+import argparse
+import subprocess
+
+MODULES = ["GEE_ISMN.preprocess", "GEE_ISMN.postprocess",
+           "GEE_ISMN.earthengine", "GEE_ISMN.setup_pkg",
+           "GEE_ISMN.visualization", "GEE_ISMN.pipeline",
+           "GEE_ISMN.results", "GEE_ISMN.analysis"]
+
+HEAVY = ["ee", "geehydro", "folium", "matplotlib", "ismn", "webbrowser",
+         "pyarrow"]
+
+_SNIPPET = """
+import sys, time, json
+start = time.perf_counter()
+import %s
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds,
+                  "heavy": [m for m in %r if m in sys.modules]}))
+"""
+
+
+def measure(module, repeat=3):
+    """Imports module in repeat fresh interpreters.
+
+    :return: Dictionary with the best import time (seconds) and the heavy
+    modules that were loaded.
+    """
+    runs = []
+    code = _SNIPPET % (module, HEAVY)
+    for i in range(repeat):
+        out = subprocess.run([sys.executable, "-c", code],
+                             check=True, capture_output=True, text=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    return {"seconds": round(min(r["seconds"] for r in runs), 4),
+            "heavy": runs[0]["heavy"]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--budget", type=float, default=1.0,
+                        help="Maximum import time per module (s).")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Fresh interpreters per module (best is used).")
+    args = parser.parse_args(argv)
+
+    failed = False
+    print("%-25s %10s  %s" % ("module", "seconds", "heavy modules loaded"))
+
+    for module in MODULES:
+        result = measure(module, args.repeat)
+        over = result["seconds"] > args.budget or result["heavy"]
+        failed = failed or over
+        print("%-25s %10.3f  %s%s" % (module, result["seconds"],
+                                      ", ".join(result["heavy"]) or "-",
+                                      "  <- over budget" if over else ""))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
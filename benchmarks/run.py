@@ -0,0 +1,273 @@
+"""Runs the whole GEE_ISMN workflow on synthetic ISMN archives against the
+fake Earth Engine backend (benchmarks/fake_ee.py) and reports wall time,
+(optionally) peak memory and the simulated requests, elements and bytes of
+every stage.
+
+    python -m benchmarks.run --stations 10 100 --records 5000 \\
+        --latency 0.05 --save results.json
+    python -m benchmarks.run --stations 10 100 --records 5000 \\
+        --latency 0.05 --compare results.json --tolerance 0.25
+
+With --compare, the exit code is 1 if a stage got slower than the baseline
+by more than the tolerance or needs more requests than before.
+"""
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import datetime
+import tempfile
+import contextlib
+import tracemalloc
+
+from benchmarks import fake_ee, synthetic
+
+STAGES = ["data_handling_cold", "data_handling_warm", "data_import_cold",
+          "data_import_warm", "data_import_window", "lc_filter",
+          "s1_per_station", "s1_batch", "s1_cache_cold", "s1_cache_warm",
+          "ts_filter", "statistics", "stream"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--stations", type=int, nargs="+", default=[10, 50],
+                        help="Archive sizes (number of stations).")
+    parser.add_argument("--records", type=int, default=5000,
+                        help="Hourly records per soil moisture file.")
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="Simulated latency per request (s).")
+    parser.add_argument("--latency-per-element", type=float, default=0.0,
+                        help="Additional latency per returned element (s).")
+    parser.add_argument("--max-concurrent", type=int, default=20,
+                        help="Concurrent requests allowed by the backend.")
+    parser.add_argument("--max-qps", type=int, default=None,
+                        help="Requests per second allowed by the backend.")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Worker threads of the request executor.")
+    parser.add_argument("--rate", type=float, default=50,
+                        help="Request rate of the request executor (1/s).")
+    parser.add_argument("--batch-size", type=int, default=50,
+                        help="Stations per request of the batch stages.")
+    parser.add_argument("--memory", action="store_true",
+                        help="Record the peak memory of every stage "
+                             "(tracemalloc, slows down the stages).")
+    parser.add_argument("--save", help="Write the results to a JSON file.")
+    parser.add_argument("--compare", help="Compare with a JSON file that "
+                                          "was written with --save.")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative slowdown with --compare.")
+    args = parser.parse_args(argv)
+
+    ee = fake_ee.install(latency=args.latency,
+                         latency_per_element=args.latency_per_element,
+                         max_concurrent=args.max_concurrent,
+                         max_qps=args.max_qps, masked=0.05)
+
+    results = {"config": {k: v for k, v in vars(args).items()
+                          if k not in ("save", "compare", "tolerance")},
+               "scales": {}}
+
+    for n_stations in args.stations:
+        results["scales"][str(n_stations)] = run_scale(ee, n_stations, args)
+        print_scale(n_stations, results["scales"][str(n_stations)])
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if baseline["config"] != results["config"]:
+            print("Warning: the baseline was run with a different "
+                  "configuration: %s" % baseline["config"])
+        regressions = compare(baseline, results, args.tolerance)
+
+        for line in regressions:
+            print("REGRESSION " + line)
+        if regressions:
+            return 1
+        print("No regressions (tolerance %d%%)." % (args.tolerance * 100))
+
+    return 0
+
+
+def run_scale(ee, n_stations, args):
+    """Runs all stages on a new synthetic archive of n_stations stations in
+    a temporary working directory.
+
+    :return: Dictionary {stage: metrics}
+    """
+    from GEE_ISMN import preprocess, earthengine, postprocess, pipeline, \
+        analysis
+    from GEE_ISMN.executor import RequestExecutor
+
+    cwd = os.getcwd()
+    tmp_dir = tempfile.mkdtemp(prefix="gee_ismn_bench_")
+    executor = RequestExecutor(max_workers=args.workers, rate=args.rate)
+    landcover_ids = sorted(set(fake_ee.LC_CLASSES))
+    input_dict = {"box_yn": 0, "box_size": None}
+    stages = {}
+
+    try:
+        os.chdir(tmp_dir)
+        synthetic.make_archive("./data/ISMN/", n_stations, args.records)
+        os.makedirs("./data/ISMN_Filt/")
+
+        for stage in ("data_handling_cold", "data_handling_warm"):
+            stages[stage] = measure(ee, args.memory, preprocess.data_handling)
+
+        stages["data_import_cold"] = measure(ee, args.memory,
+                                             preprocess.data_import)
+        stages["data_import_warm"] = measure(ee, args.memory,
+                                             preprocess.data_import)
+        data_dict = stages["data_import_warm"].pop("result")
+        stages["data_import_cold"].pop("result")
+
+        # Second half of the (hourly) records, first read of this window.
+        window_start = datetime.datetime(2015, 1, 1) \
+            + datetime.timedelta(hours=args.records // 2)
+        stages["data_import_window"] = measure(
+            ee, args.memory, preprocess.data_import, start=window_start)
+
+        stages["lc_filter"] = measure(
+            ee, args.memory, earthengine.lc_filter, data_dict, input_dict,
+            landcover_ids=landcover_ids, executor=executor)
+        data_dict = stages["lc_filter"].pop("result")
+
+        stages["s1_per_station"] = measure(
+            ee, args.memory, earthengine.get_s1_backscatter, data_dict,
+            executor=executor)
+        reference = _backscatter(data_dict)
+        stages["s1_batch"] = measure(
+            ee, args.memory, earthengine.get_s1_backscatter, data_dict,
+            batch_size=args.batch_size, executor=executor)
+        check("s1_batch", reference, data_dict)
+
+        # The cold run only sees the scenes up to the middle of the soil
+        # moisture records, the warm run has to fetch the rest (like a
+        # regular refresh of the cache).
+        end = ee.backend.end
+        ee.backend.end = datetime.datetime(2015, 1, 1) \
+            + datetime.timedelta(hours=args.records // 2)
+        try:
+            stages["s1_cache_cold"] = measure(
+                ee, args.memory, earthengine.get_s1_backscatter, data_dict,
+                executor=executor, cache_dir="./data/S1_Cache/")
+        finally:
+            ee.backend.end = end
+        stages["s1_cache_warm"] = measure(
+            ee, args.memory, earthengine.get_s1_backscatter, data_dict,
+            executor=executor, cache_dir="./data/S1_Cache/")
+        data_dict = stages["s1_cache_warm"].pop("result")
+        check("s1_cache_warm", reference, data_dict)
+
+        stages["ts_filter"] = measure(ee, args.memory, postprocess.ts_filter,
+                                      data_dict)
+        stages["statistics"] = measure(ee, args.memory,
+                                       analysis.station_statistics, data_dict,
+                                       seasonal=True)
+        del data_dict
+
+        def _stream():
+            stream = pipeline.stream_stations(input_dict, landcover_ids,
+                                              executor=executor)
+            return sum(1 for item in stream)
+
+        stages["stream"] = measure(ee, args.memory, _stream)
+    finally:
+        os.chdir(cwd)
+        executor.shutdown()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    for metrics in stages.values():
+        metrics.pop("result", None)
+
+    return stages
+
+
+def measure(ee, memory, fn, *args, **kwargs):
+    """Calls fn (with suppressed output) and measures it.
+
+    :return: Dictionary with the metrics and the return value ('result').
+    """
+    ee.backend.reset_stats()
+    if memory:
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn(*args, **kwargs)
+    seconds = time.perf_counter() - start
+
+    metrics = {"seconds": round(seconds, 4)}
+    if memory:
+        metrics["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20,
+                                   2)
+        tracemalloc.stop()
+    metrics.update(ee.backend.stats)
+    metrics["result"] = result
+
+    return metrics
+
+
+def _backscatter(data_dict):
+    return {key: (station.backscatter_desc, station.backscatter_asc)
+            for key, station in data_dict.items()}
+
+
+def check(stage, reference, data_dict):
+    """Checks that a stage extracted the same backscatter as the
+    s1_per_station stage (reference, see _backscatter()).
+    """
+    for key, frames in _backscatter(data_dict).items():
+        for df, ref in zip(frames, reference[key]):
+            if (df is None) != (ref is None) \
+                    or (df is not None and not df.equals(ref)):
+                raise RuntimeError("%s: the backscatter of %s differs from "
+                                   "the s1_per_station stage." % (stage, key))
+
+
+def print_scale(n_stations, stages):
+    print("\n%d stations" % n_stations)
+    print("%-20s %10s %10s %9s %10s %12s %9s"
+          % ("stage", "seconds", "peak_mb", "requests", "elements", "bytes",
+             "throttled"))
+
+    for stage in STAGES:
+        m = stages[stage]
+        print("%-20s %10.3f %10s %9d %10d %12d %9d"
+              % (stage, m["seconds"], m.get("peak_mb", "-"), m["requests"],
+                 m["elements"], m["bytes"], m["throttled"]))
+
+
+def compare(baseline, results, tolerance):
+    """Compares the results with a baseline.
+
+    :return: List of messages, one per regression.
+    """
+    regressions = []
+
+    for scale, stages in results["scales"].items():
+        for stage, m in stages.items():
+            base = baseline["scales"].get(scale, {}).get(stage)
+            if base is None:
+                continue
+
+            if m["seconds"] > base["seconds"] * (1 + tolerance):
+                regressions.append("%s stations, %s: %.3f s (baseline %.3f s)"
+                                   % (scale, stage, m["seconds"],
+                                      base["seconds"]))
+            if m["requests"] > base["requests"]:
+                regressions.append("%s stations, %s: %d requests (baseline "
+                                   "%d)" % (scale, stage, m["requests"],
+                                            base["requests"]))
+
+    return regressions
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+import os
+import numpy as np
+import pandas as pd
+
+SENSORS = ("ThetaProbe-ML2X", "Stevens-Hydra-Probe", "5TM")
+
+
+def make_archive(root, n_stations, n_records, start="2015-01-01", freq="h",
+                 depths=(0.05, 0.10), n_networks=None, seed=0):
+    """Writes a synthetic ISMN archive in the Header + values format, laid
+    out like a real download (root/NETWORK/STATION/*.stm).
+
+    Every station gets one soil moisture file per depth. Stations are
+    spread over a few networks in Europe; stations of a network lie close
+    together, like in real networks.
+
+    :param root: Target directory (e.g. './data/ISMN/').
+        :type: String
+    :param n_stations: Number of stations.
+        :type: int
+    :param n_records: Number of records per file.
+        :type: int
+    :param start: (optional) Timestamp of the first record.
+        :type: String
+    :param freq: (optional) Record interval (pandas frequency string).
+        :type: String
+    :param depths: (optional) Measurement depths (m), one file each.
+        :type: tuple of float
+    :param n_networks: (optional) Number of networks. Defaults to one
+    network per 20 stations.
+        :type: int
+    :param seed: (optional) Seed of the random generator.
+        :type: int
+
+    :return: List of paths of the written files.
+    """
+    rng = np.random.default_rng(seed)
+    n_networks = n_networks or max(1, n_stations // 20)
+    centers = np.column_stack([rng.uniform(36, 60, n_networks),
+                               rng.uniform(-8, 25, n_networks)])
+
+    dates = pd.date_range(start, periods=n_records, freq=freq)
+    stamps = dates.strftime("%Y/%m/%d %H:%M")
+    first = dates[0].strftime("%Y%m%d")
+    last = dates[-1].strftime("%Y%m%d")
+
+    paths = []
+    for i in range(n_stations):
+        network = "NET%d" % (i % n_networks)
+        station = "ST%d" % i
+        lat, lon = centers[i % n_networks] + rng.normal(0, 0.2, 2)
+        elevation = rng.uniform(0, 1500)
+        sensor = SENSORS[i % len(SENSORS)]
+        directory = os.path.join(root, network, station)
+        os.makedirs(directory, exist_ok=True)
+
+        for depth in depths:
+            values = np.clip(0.25 + 0.1 * np.sin(np.arange(n_records) / 500.)
+                             + rng.normal(0, 0.02, n_records), 0, 0.6)
+            flags = np.where(rng.random(n_records) < 0.95, "G", "D01")
+            name = "%s_%s_%s_sm_%.6f_%.6f_%s_%s_%s.stm" % (
+                network, network, station, depth, depth, sensor, first, last)
+            path = os.path.join(directory, name)
+
+            with open(path, "w") as file:
+                file.write("CSE %s %s %.5f %.5f %.2f %.2f %.2f %s\n"
+                           % (network, station, lat, lon, elevation, depth,
+                              depth, sensor))
+                file.writelines("%s %.4f %s M\n" % row
+                                for row in zip(stamps, values, flags))
+
+            paths.append(path)
+
+    return paths
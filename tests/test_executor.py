@@ -0,0 +1,109 @@
+import time
+import pytest
+from benchmarks import fake_ee
+from GEE_ISMN import earthengine
+from GEE_ISMN.executor import RequestExecutor, is_retryable
+
+
+@pytest.fixture
+def ee():
+    return fake_ee.install()
+
+
+def _executor(delays, **kwargs):
+    """Executor that records the backoff delays instead of sleeping."""
+    kwargs.setdefault("rate", None)
+    return RequestExecutor(max_workers=1, sleep=delays.append, **kwargs)
+
+
+def test_retries_with_exponential_backoff(ee):
+    ee.backend.fail("503 Service Unavailable", 3)
+    delays = []
+    executor = _executor(delays, backoff=1.0, max_backoff=60.0)
+
+    assert executor.get_info(ee.Number(42)) == 42
+    assert len(delays) == 3
+    for attempt, delay in enumerate(delays):
+        assert 0.5 * 2 ** attempt <= delay <= 2 ** attempt
+
+
+def test_backoff_is_capped(ee):
+    ee.backend.fail("429 Too Many Requests", 4)
+    delays = []
+    executor = _executor(delays, backoff=1.0, max_backoff=2.0)
+
+    assert executor.get_info(ee.Number(1)) == 1
+    assert max(delays) <= 2.0
+
+
+def test_gives_up_after_max_retries(ee):
+    ee.backend.fail("429 Too Many Requests", 3)
+    delays = []
+    executor = _executor(delays, max_retries=2)
+
+    with pytest.raises(fake_ee.EEException):
+        executor.get_info(ee.Number(1))
+    assert len(delays) == 2
+
+
+def test_other_errors_are_not_retried(ee):
+    ee.backend.fail("Image.load: Asset not found.")
+    delays = []
+
+    with pytest.raises(fake_ee.EEException):
+        _executor(delays).get_info(ee.Number(1))
+    assert delays == []
+
+
+def test_no_retry_on(ee):
+    delays = []
+    executor = _executor(delays)
+
+    ee.backend.fail("Computation timed out.")
+    with executor.no_retry_on(earthengine._too_large):
+        with pytest.raises(fake_ee.EEException):
+            executor.get_info(ee.Number(1))
+    assert delays == []
+
+    ee.backend.fail("Computation timed out.")
+    assert executor.get_info(ee.Number(1)) == 1
+    assert len(delays) == 1
+
+
+def test_throttled_requests_are_retried(ee):
+    ee.backend.max_qps = 3
+    delays = []
+
+    def _sleep(seconds):
+        delays.append(seconds)
+        time.sleep(seconds)
+
+    executor = RequestExecutor(max_workers=1, rate=None, backoff=0.5,
+                               max_backoff=1.0, sleep=_sleep)
+
+    assert [executor.get_info(ee.Number(i)) for i in range(5)] \
+        == list(range(5))
+    assert ee.backend.stats["throttled"] == len(delays) > 0
+
+
+def test_rate_limit_avoids_throttling(ee):
+    ee.backend.max_qps = 25
+    executor = RequestExecutor(max_workers=4, rate=20, burst=1)
+
+    values = executor.map(lambda i: executor.get_info(ee.Number(i)),
+                          range(30))
+
+    assert values == list(range(30))
+    assert ee.backend.stats["throttled"] == 0
+
+
+@pytest.mark.parametrize("message, retryable", [
+    ("429 Too Many Requests", True),
+    ("HTTP Error 503", True),
+    ("Computation timed out.", True),
+    ("Too many concurrent aggregations.", True),
+    ("Collection query aborted after accumulating over 14290 elements.",
+     False),
+    ("Image.load: Asset 'users/x/25031' not found.", False)])
+def test_is_retryable(message, retryable):
+    assert is_retryable(Exception(message)) is retryable
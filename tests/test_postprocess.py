@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+from GEE_ISMN import postprocess
+from GEE_ISMN.station import Station
+
+
+def _reference(timeseries_s1, timeseries_sm):
+    """Matching of the nested loops that ts_filter() used before the as-of
+    join: each S-1 timestamp (duplicates skipped) is paired with the last
+    soil moisture measurement before the first one that is later than the
+    scene.
+    """
+    copy_sm = list(timeseries_sm.index)
+    rows = []
+    last_timestamp = None
+
+    for timestamp in timeseries_s1.index:
+        if last_timestamp == timestamp:
+            continue
+        last_timestamp = timestamp
+        sm_series = None
+        result = None
+        for i in range(len(copy_sm)):
+            if copy_sm[i].tz_localize(None) > timestamp:
+                result = sm_series
+                break
+            sm_series = i
+
+        if result is not None:
+            first = timeseries_s1.loc[[timestamp]].iloc[0]
+            rows.append((timestamp, first["VH"], first["VV"],
+                         copy_sm[result].tz_localize(None),
+                         timeseries_sm.at[copy_sm[result], "soil moisture"]))
+            copy_sm = copy_sm[result:]
+
+    return rows
+
+
+def _random_station(rng):
+    start = pd.Timestamp("2020-01-01")
+    n_sm = rng.integers(0, 40)
+    hours = np.sort(rng.choice(200, n_sm, replace=False))
+    sm = pd.DataFrame({"soil moisture": rng.random(n_sm)},
+                      index=pd.DatetimeIndex(
+                          start + pd.to_timedelta(hours, "h"), tz="UTC"))
+
+    s1 = {}
+    for orbit in ("desc", "asc"):
+        n_s1 = rng.integers(1, 30)
+        # Duplicate timestamps and scenes outside of the soil moisture
+        # record included.
+        hours = np.sort(rng.integers(-10, 210, n_s1))
+        s1[orbit] = pd.DataFrame(
+            {"VH": rng.random(n_s1), "VV": rng.random(n_s1),
+             "angle": rng.random(n_s1)},
+            index=pd.DatetimeIndex(start + pd.to_timedelta(hours, "h")))
+
+    station = Station(50.0, 11.0, sm)
+    station.backscatter_desc = s1["desc"]
+    station.backscatter_asc = s1["asc"]
+
+    return station
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_ts_filter_matches_nested_loops(seed):
+    rng = np.random.default_rng(seed)
+    data_dict = {str(i): _random_station(rng) for i in range(10)}
+
+    postprocess.ts_filter(data_dict)
+
+    for station in data_dict.values():
+        for orbit in ("desc", "asc"):
+            matched = getattr(station, "matched_" + orbit)
+            expected = _reference(getattr(station, "backscatter_" + orbit),
+                                  station.sm_data)
+            actual = list(zip(matched["t_s1_" + orbit],
+                              matched["VH_" + orbit],
+                              matched["VV_" + orbit], matched["t_sm"],
+                              matched["sm"]))
+
+            assert actual == expected
+
+
+def test_ts_filter_without_backscatter():
+    station = Station(50.0, 11.0, pd.DataFrame(
+        {"soil moisture": [0.2]},
+        index=pd.DatetimeIndex(["2020-01-01"])))
+
+    postprocess.ts_filter({"a": station})
+
+    assert station.matched_desc is None
+    assert station.matched_asc is None